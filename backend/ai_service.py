@@ -1,24 +1,322 @@
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Callable, AsyncIterator, Type
 import logging
 import httpx
 import asyncio
-from groq import AsyncGroq
+import copy
+import hashlib
+import math
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from contextlib import asynccontextmanager
+from groq import AsyncGroq, APIConnectionError, APIStatusError, APITimeoutError
 from dotenv import load_dotenv
 from pathlib import Path
 import json
+from functools import lru_cache
+from pydantic import BaseModel, ValidationError
+
+from singleflight import SingleFlight
+from prompt_builder import PromptBuilder, compact_table, estimate_tokens
+from json_stream import ParseStats, extract_json
+from llm_health import LLMHealthMonitor
+from metrics import FALLBACKS, LLM_CALL_SECONDS, UPSTREAM_ERRORS
+from llm_usage import DEFAULT_LIMITS, GenerationLimits, UsageTracker, parse_limit_overrides
+from models import (
+    BudgetAnalysisPayload, InvestmentAdvicePayload, IncomeOpportunitiesPayload,
+    OpportunityScanPayload, LessonsPayload, FinancialPlanPayload
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+def bucket_amount(amount: Any) -> int:
+    """Round a money amount to two significant figures (5123 -> 5100) so similar profiles share cache entries."""
+    try:
+        amount = float(amount or 0)
+    except (TypeError, ValueError):
+        return 0
+    if amount <= 0:
+        return 0
+    step = 10 ** max(int(math.floor(math.log10(amount))) - 1, 0)
+    return int(round(amount / step) * step)
+
+# Shape of each generator's JSON reply, as told to the model
+SCHEMA_HINTS = {
+    "income": "{ opportunities: Array<{ title: string, description: string, category: 'freelance'|'side-hustle'|'gig', estimated_income: string, effort_level: 'low'|'medium'|'high', time_commitment: string, skills_required: string[] }> }",
+    "budget": "{ spending_leaks: Array<{ category: string, amount: number, description: string }>, recommendations: string[], potential_savings: number }",
+    "investment": "{ level: string, recommendations: Array<{ type: string, allocation: number, description: string, risk: string }>, risk_assessment: string, portfolio_suggestion: { strategy: string, rebalance_frequency: string, expected_return: string } }",
+    "scan": "{ opportunities: Array<{ type: 'Grant'|'Investment'|'Skill'|'Side-Hustle', title: string, description: string, risk_level?: string, deadline?: string }>, market_trends: string[], personalized_alerts: string[] }",
+    "lessons": "{ lessons: Array<{ title: string, category: string, content: string, duration_minutes: number, points: number }> }"
+}
+
+# Reply model per method: sent as the response schema in JSON mode and used to validate replies
+PAYLOAD_MODELS = {
+    "income": IncomeOpportunitiesPayload,
+    "budget": BudgetAnalysisPayload,
+    "investment": InvestmentAdvicePayload,
+    "scan": OpportunityScanPayload,
+    "lessons": LessonsPayload,
+    "plan": FinancialPlanPayload
+}
+
+@lru_cache(maxsize=None)
+def _json_schema(payload_model: Type[BaseModel]) -> Dict[str, Any]:
+    return payload_model.model_json_schema()
+
+def lesson_id(financial_level: str, title: str) -> str:
+    """Stable id for a generated lesson, derived from its level and title."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"lesson:{financial_level.lower()}:{title.strip().lower()}"))
+
+def normalize_skills(skills: Optional[List[str]]) -> List[str]:
+    return sorted({skill.strip().lower() for skill in (skills or []) if skill and skill.strip()})
+
+class ResponseCache:
+    """TTL + LRU cache of parsed advisor responses.
+
+    The in-process tier is always on. When a MongoDB collection is attached
+    it acts as a shared second tier that survives restarts and is consulted
+    on in-process misses.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.store = None
+        self.logger = logging.getLogger("ResponseCache")
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def attach_store(self, collection):
+        """Use a motor collection as the second tier."""
+        self.store = collection
+
+    @staticmethod
+    def make_key(namespace: str, inputs: Dict[str, Any]) -> str:
+        payload = json.dumps({"ns": namespace, **inputs}, sort_keys=True, default=str)
+        return f"{namespace}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    async def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(value)
+            del self._entries[key]
+
+        if self.store is not None:
+            try:
+                doc = await self.store.find_one(
+                    {"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                    {"_id": 0, "value": 1, "expires_at": 1}
+                )
+            except Exception as e:
+                self.logger.warning(f"Response cache store read failed: {e}")
+                doc = None
+            if doc:
+                expires_at = doc["expires_at"]
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+                self._remember(key, doc["value"], remaining)
+                self.store_hits += 1
+                return copy.deepcopy(doc["value"])
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Any):
+        self._remember(key, value, self.ttl_seconds)
+        if self.store is not None:
+            try:
+                await self.store.update_one(
+                    {"key": key},
+                    {"$set": {
+                        "key": key,
+                        "value": value,
+                        "expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                self.logger.warning(f"Response cache store write failed: {e}")
+
+    def _remember(self, key: str, value: Any, ttl_seconds: float):
+        self._entries[key] = (copy.deepcopy(value), time.monotonic() + ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "store_attached": self.store is not None
+        }
+
+class GatewayRejectedError(Exception):
+    """Raised when the LLM gateway sheds a call instead of sending it upstream."""
+
+class ChatStreamInterrupted(Exception):
+    """Raised when a streamed chat reply breaks off after part of it was already yielded."""
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """True for errors that mean Groq itself is unavailable or throttling us."""
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+class LLMGateway:
+    """Admission control in front of Groq.
+
+    Calls must pass a circuit breaker, take a token from a token bucket and
+    acquire a concurrency slot before going upstream. Calls that fail any of
+    these are rejected immediately, so callers drop to their deterministic
+    fallbacks instead of piling onto an outage or a 429 storm.
+    """
+
+    def __init__(self, max_concurrency: int, rate_per_minute: float, burst: int,
+                 failure_threshold: int, reset_timeout: float, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_minute / 60.0
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._in_flight = 0
+        self.circuit = "closed"  # closed, open, half_open
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = {"circuit_open": 0, "rate_limited": 0, "busy": 0}
+
+    def _admit_circuit(self) -> bool:
+        if self.circuit == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            self.circuit = "half_open"
+        if self.circuit == "half_open":
+            # Let exactly one trial call through to probe whether Groq has recovered
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+        return True
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_per_second)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    @asynccontextmanager
+    async def slot(self):
+        if not self._admit_circuit():
+            self.rejected["circuit_open"] += 1
+            raise GatewayRejectedError("circuit open")
+        if not self._take_token():
+            self._trial_in_flight = False
+            self.rejected["rate_limited"] += 1
+            raise GatewayRejectedError("rate limited")
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._trial_in_flight = False
+            self.rejected["busy"] += 1
+            raise GatewayRejectedError("all LLM slots busy")
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+            self._trial_in_flight = False
+
+    def record_success(self):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.circuit = "closed"
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.circuit == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.circuit = "open"
+            self._opened_at = time.monotonic()
+
+    def state(self) -> Dict[str, Any]:
+        retry_in = 0.0
+        if self.circuit == "open":
+            retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+        return {
+            "circuit": self.circuit,
+            "retry_in_seconds": round(retry_in, 1),
+            "consecutive_failures": self.consecutive_failures,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "tokens_available": round(min(self.burst, self._tokens + (time.monotonic() - self._refilled_at) * self.rate_per_second), 1),
+            "successes": self.successes,
+            "failures": self.failures,
+            "rejected": dict(self.rejected)
+        }
+
 class AIFinancialAdvisor:
     def __init__(self):
         self.groq_api_key = os.environ.get('GROQ_API_KEY')
         self.groq_model = os.environ.get('GROQ_MODEL', 'llama-3.1-8b-instant')
-        self.client = AsyncGroq(api_key=self.groq_api_key) if self.groq_api_key else None
-        self.http_client = httpx.AsyncClient(timeout=30.0)
+        # Per attempt; with SDK retries a hung call holds its gateway slot for at most (retries + 1) times this
+        self.call_timeout = float(os.environ.get('LLM_CALL_TIMEOUT', '15'))
+        # Keep SDK-level retries low; the gateway below decides when to back off
+        self.client = AsyncGroq(
+            api_key=self.groq_api_key,
+            max_retries=int(os.environ.get('GROQ_MAX_RETRIES', '1')),
+            timeout=self.call_timeout
+        ) if self.groq_api_key else None
+        self.http_client = httpx.AsyncClient(timeout=self.call_timeout)
         self.logger = logging.getLogger("AIFinancialAdvisor")
         self.last_error = None
+        self.response_cache = ResponseCache(
+            ttl_seconds=float(os.environ.get('AI_CACHE_TTL', '21600')),
+            max_entries=int(os.environ.get('AI_CACHE_MAX_ENTRIES', '512'))
+        )
+        self._llm_flights = SingleFlight()
+        self.gateway = LLMGateway(
+            max_concurrency=int(os.environ.get('LLM_MAX_CONCURRENCY', '8')),
+            rate_per_minute=float(os.environ.get('LLM_RATE_PER_MINUTE', '30')),
+            burst=int(os.environ.get('LLM_RATE_BURST', '10')),
+            failure_threshold=int(os.environ.get('LLM_BREAKER_THRESHOLD', '5')),
+            reset_timeout=float(os.environ.get('LLM_BREAKER_RESET', '30')),
+            queue_timeout=float(os.environ.get('LLM_QUEUE_TIMEOUT', '5'))
+        )
+        self.prompt_budget_tokens = int(os.environ.get('LLM_PROMPT_BUDGET_TOKENS', '1500'))
+        self.usage = UsageTracker(
+            limits={**DEFAULT_LIMITS, **parse_limit_overrides(os.environ.get('LLM_LIMITS', ''))},
+            adaptive=os.environ.get('LLM_ADAPTIVE_LIMITS', 'false').lower() == 'true'
+        )
+        self.json_stats = ParseStats()
+        # json_object: provider JSON mode; json_schema: also send the payload schema (model must support it); off: prompt only
+        self.response_format = os.environ.get('LLM_RESPONSE_FORMAT', 'json_object').lower()
+        self.response_format_rejections = 0
+        self.health = LLMHealthMonitor(probe=self._probe_llm, rejections=(GatewayRejectedError,))
+    
+    def _prompt(self, method: str) -> PromptBuilder:
+        return PromptBuilder(method, self.prompt_budget_tokens)
     
     def _json_instructions(self, schema_hint: str) -> str:
         return (
@@ -27,157 +325,398 @@ class AIFinancialAdvisor:
             f"Schema hint: {schema_hint}"
         )
 
-    def _safe_json_load(self, text: str) -> Any:
-        """Best-effort JSON extraction. Falls back to empty structure on failure."""
-        if not text:
-            return None
-        try:
-            return json.loads(text)
-        except Exception:
-            pass
-        try:
-            start_obj = text.find('{')
-            start_arr = text.find('[')
-            starts = [x for x in [start_obj, start_arr] if x != -1]
-            if not starts:
-                return None
-            start = min(starts)
-            end = max(text.rfind('}'), text.rfind(']'))
-            if end > start:
-                snippet = text[start:end+1]
-                return json.loads(snippet)
-        except Exception:
-            return None
+    def _load_json(self, text: str, method: Optional[str]) -> Tuple[Any, str]:
+        """Tolerant JSON extraction; a truncated reply yields its complete leading elements.
+        
+        Returns (value, outcome), outcome being one of ParseStats.OUTCOMES. Outcomes
+        are counted under ``method``; pass None for text that was already counted.
+        """
+        payload_model = PAYLOAD_MODELS.get(method)
+        if not text or not text.strip():
+            value, outcome = None, "empty"
+        else:
+            value = None
+            if payload_model is not None:
+                # JSON-mode replies normally validate as-is and skip the tolerant scan
+                try:
+                    value, outcome = payload_model.model_validate_json(text).model_dump(exclude_none=True), "validated"
+                except ValidationError:
+                    pass
+            if value is None:
+                value, complete = extract_json(text)
+                outcome = "complete" if complete else "recovered" if value is not None else "failed"
+        if method:
+            self.json_stats.record(method, outcome)
+        return value, outcome
+    
+    async def _generate_cached(self, namespace: str, inputs: Dict[str, Any], prompt: str,
+                               parse: Callable[[str], Tuple[Any, str]]) -> Tuple[Any, bool]:
+        """Serve a cached result for identical normalized inputs, otherwise call the LLM and cache the parse.
+        
+        Returns (result, used_fallback). ``parse`` returns (result, outcome), where
+        outcome is the _load_json outcome, or "fallback" when it served canned data.
+        """
+        key = self.response_cache.make_key(namespace, inputs)
+        cached = await self.response_cache.get(key)
+        if cached is not None:
+            return cached, False
+        
+        response = await self._call_llm(prompt, namespace, payload_model=PAYLOAD_MODELS.get(namespace))
+        result, outcome = parse(response)
+        # Only cache complete model output; fallbacks and salvaged partial replies should be retried next time
+        if outcome in ("validated", "complete"):
+            await self.response_cache.set(key, result)
+        return result, outcome == "fallback"
     
-    async def generate_income_opportunities(self, skills: List[str], location: str, time_availability: str, financial_level: str) -> List[Dict[str, Any]]:
+    async def generate_income_opportunities(self, skills: List[str], location: str, time_availability: str, financial_level: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """Returns (opportunities, used_fallback).
+        
+        The budget, investment and scan generators below return the same pair.
+        Two differ: generate_personalized_lessons returns (lessons, outcome) so
+        the lessons route can pick a storage TTL, and generate_financial_plan
+        returns one dict that lists its fallen-back sections in ``fallback_sections``.
+        """
         try:
-            schema = "{ opportunities: Array<{ title: string, description: string, category: 'freelance'|'side-hustle'|'gig', estimated_income: string, effort_level: 'low'|'medium'|'high', time_commitment: string, skills_required: string[] }> }"
+            schema = SCHEMA_HINTS["income"]
             prompt = (
-                f"You are a financial advisor. Generate 3 personalized income opportunities for someone with:\n"
-                f"Skills: {', '.join(skills) if skills else 'general skills'}\n"
-                f"Location: {location or 'any location'}\n"
-                f"Time: {time_availability or 'flexible'}\n"
-                f"Level: {financial_level or 'beginner'}\n\n"
-                "Be specific and practical."
-                + self._json_instructions(schema)
+                self._prompt("income")
+                .add("You are a financial advisor. Generate 3 personalized income opportunities for someone with:\n")
+                .add_optional(f"Skills: {', '.join(skills) if skills else 'general skills'}\n")
+                .add(
+                    f"Location: {location or 'any location'}\n"
+                    f"Time: {time_availability or 'flexible'}\n"
+                    f"Level: {financial_level or 'beginner'}\n\n"
+                    "Be specific and practical."
+                    + self._json_instructions(schema)
+                )
+                .build()
             )
+            inputs = {
+                "skills": normalize_skills(skills),
+                "location": (location or '').strip().lower(),
+                "time": (time_availability or '').strip().lower(),
+                "level": (financial_level or 'beginner').lower()
+            }
             
-            response = await self._call_llm(prompt)
-            return self._parse_opportunities(response)
+            return await self._generate_cached("income", inputs, prompt, self._parse_opportunities)
         except Exception as e:
             print(f"AI Service error in generate_income_opportunities: {e}")
-            return self._parse_opportunities("")
+            return self._parse_opportunities("")[0], True
     
-    async def analyze_budget(self, monthly_income: float, monthly_expenses: float, spending_patterns: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze_budget(self, monthly_income: float, monthly_expenses: float, spending_patterns: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
         try:
-            schema = "{ spending_leaks: Array<{ category: string, amount: number, description: string }>, recommendations: string[], potential_savings: number }"
+            schema = SCHEMA_HINTS["budget"]
+            # Bucketed amounts go into the prompt too, so a cached answer never quotes another user's exact figures
+            income = bucket_amount(monthly_income)
+            expenses = bucket_amount(monthly_expenses)
             prompt = (
-                "You are a financial advisor. Analyze this budget:\n"
-                f"Income: ${monthly_income}/month\n"
-                f"Expenses: ${monthly_expenses}/month\n"
-                f"Net: ${monthly_income - monthly_expenses}/month\n\n"
-                "Identify 3-5 spending leaks and provide actionable recommendations to save money. Estimate potential monthly savings."
-                + self._json_instructions(schema)
+                self._prompt("budget")
+                .add(
+                    "You are a financial advisor. Analyze this budget:\n"
+                    f"Income: ${income}/month\n"
+                    f"Expenses: ${expenses}/month\n"
+                    f"Net: ${income - expenses}/month\n\n"
+                    "Identify 3-5 spending leaks and provide actionable recommendations to save money. Estimate potential monthly savings."
+                    + self._json_instructions(schema)
+                )
+                .build()
             )
+            inputs = {"income": income, "expenses": expenses}
             
-            response = await self._call_llm(prompt)
-            return self._parse_budget_analysis(response)
+            return await self._generate_cached("budget", inputs, prompt, self._parse_budget_analysis)
         except Exception as e:
             print(f"AI Service error in analyze_budget: {e}")
-            return self._parse_budget_analysis("")
+            return self._parse_budget_analysis("")[0], True
     
-    async def provide_investment_advice(self, financial_level: str, risk_tolerance: str, monthly_savings: float) -> Dict[str, Any]:
+    async def provide_investment_advice(self, financial_level: str, risk_tolerance: str, monthly_savings: float) -> Tuple[Dict[str, Any], bool]:
         try:
-            schema = "{ level: string, recommendations: Array<{ type: string, allocation: number, description: string, risk: string }>, risk_assessment: string, portfolio_suggestion: { strategy: string, rebalance_frequency: string, expected_return: string } }"
+            schema = SCHEMA_HINTS["investment"]
+            savings = bucket_amount(monthly_savings)
             prompt = (
-                "You are a financial advisor. Provide investment advice for:\n"
-                f"Level: {financial_level}\n"
-                f"Risk: {risk_tolerance}\n"
-                f"Monthly savings: ${monthly_savings}\n\n"
-                "Include specific investment recommendations with allocations, portfolio strategy, and risk assessment."
-                + self._json_instructions(schema)
+                self._prompt("investment")
+                .add(
+                    "You are a financial advisor. Provide investment advice for:\n"
+                    f"Level: {financial_level}\n"
+                    f"Risk: {risk_tolerance}\n"
+                    f"Monthly savings: ${savings}\n\n"
+                    "Include specific investment recommendations with allocations, portfolio strategy, and risk assessment."
+                    + self._json_instructions(schema)
+                )
+                .build()
             )
+            inputs = {
+                "level": (financial_level or 'beginner').lower(),
+                "risk": (risk_tolerance or 'moderate').lower(),
+                "savings": savings
+            }
             
-            response = await self._call_llm(prompt)
-            return self._parse_investment_advice(response)
+            return await self._generate_cached("investment", inputs, prompt, self._parse_investment_advice)
         except Exception as e:
             print(f"AI Service error in provide_investment_advice: {e}")
-            return self._parse_investment_advice("")
+            return self._parse_investment_advice("")[0], True
     
-    async def scan_opportunities(self, user_profile: Dict[str, Any], market_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def scan_opportunities(self, user_profile: Dict[str, Any], market_data: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
         try:
-            schema = "{ opportunities: Array<{ type: 'Grant'|'Investment'|'Skill'|'Side-Hustle', title: string, description: string, risk_level?: string, deadline?: string }>, market_trends: string[], personalized_alerts: string[] }"
+            schema = SCHEMA_HINTS["scan"]
+            # One row per symbol instead of the repr of each quote dict; rows past the budget are dropped
+            market_table = compact_table(market_data.get('stocks', []), ["symbol", "price", "change_percent"])
             prompt = (
-                "You are a market analyst. Based on user profile and current market data, identify: \n"
-                "1. Emerging market opportunities\n"
-                "2. Grants or funding they may qualify for\n"
-                "3. Skills they could monetize\n"
-                "4. Investment opportunities\n\n"
-                f"User: {user_profile.get('financial_level', 'beginner')} level, {user_profile.get('risk_tolerance', 'moderate')} risk\n"
-                f"Market: {market_data.get('stocks', [])}\n"
-                + self._json_instructions(schema)
+                self._prompt("scan")
+                .add(
+                    "You are a market analyst. Based on user profile and current market data, identify: \n"
+                    "1. Emerging market opportunities\n"
+                    "2. Grants or funding they may qualify for\n"
+                    "3. Skills they could monetize\n"
+                    "4. Investment opportunities\n\n"
+                    f"User: {user_profile.get('financial_level', 'beginner')} level, {user_profile.get('risk_tolerance', 'moderate')} risk\n"
+                    "Market:\n"
+                )
+                .add_optional(market_table + "\n")
+                .add(self._json_instructions(schema))
+                .build()
             )
             
-            response = await self._call_llm(prompt)
-            return self._parse_opportunity_scan(response)
+            response = await self._call_llm(prompt, "scan", payload_model=OpportunityScanPayload)
+            result, outcome = self._parse_opportunity_scan(response)
+            return result, outcome == "fallback"
         except Exception as e:
             print(f"AI Service error in scan_opportunities: {e}")
-            return self._parse_opportunity_scan("")
+            return self._parse_opportunity_scan("")[0], True
     
-    async def generate_personalized_lessons(self, financial_level: str, user_profile: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Generate personalized education lessons based on user profile"""
+    def _lesson_inputs(self, financial_level: str, user_profile: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "level": (financial_level or 'beginner').lower(),
+            "skills": normalize_skills(user_profile.get('skills', [])),
+            "income": bucket_amount(user_profile.get('monthly_income', 0))
+        }
+    
+    def lesson_fingerprint(self, financial_level: str, user_profile: Dict[str, Any]) -> str:
+        """Fingerprint of the profile fields that shape generated lessons; changes only on material edits."""
+        return ResponseCache.make_key("lessons", self._lesson_inputs(financial_level, user_profile))
+    
+    async def generate_personalized_lessons(self, financial_level: str, user_profile: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], str]:
+        """Generate personalized education lessons based on user profile.
+        
+        Not held in the response cache: the lessons route stores each set under
+        its profile fingerprint, which is the persistence tier for lessons.
+        Returns (lessons, outcome) rather than a fallback flag so the route can
+        tell a salvaged partial set from a complete one.
+        """
         try:
-            schema = "{ lessons: Array<{ title: string, category: string, content: string, duration_minutes: number, points: number }> }"
+            schema = SCHEMA_HINTS["lessons"]
             skills = user_profile.get('skills', [])
-            income = user_profile.get('monthly_income', 0)
+            inputs = self._lesson_inputs(financial_level, user_profile)
+            income = inputs["income"]
             
             prompt = (
-                f"You are a financial education expert. Generate 4 personalized financial education lessons for:\n"
-                f"Level: {financial_level}\n"
-                f"Skills: {', '.join(skills) if skills else 'general'}\n"
-                f"Income: ${income}/month\n\n"
-                "Create lessons that are practical, actionable, and relevant to their situation. "
-                "Include beginner, intermediate, and advanced topics. "
-                "Each lesson should have: title, category (Basics/Budgeting/Investing/Advanced), "
-                "content (1-2 sentences), duration (15-45 min), points (100-300)."
-                + self._json_instructions(schema)
+                self._prompt("lessons")
+                .add(
+                    f"You are a financial education expert. Generate 4 personalized financial education lessons for:\n"
+                    f"Level: {financial_level}\n"
+                )
+                .add_optional(f"Skills: {', '.join(skills) if skills else 'general'}\n")
+                .add(
+                    f"Income: ${income}/month\n\n"
+                    "Create lessons that are practical, actionable, and relevant to their situation. "
+                    "Include beginner, intermediate, and advanced topics. "
+                    "Each lesson should have: title, category (Basics/Budgeting/Investing/Advanced), "
+                    "content (1-2 sentences), duration (15-45 min), points (100-300)."
+                    + self._json_instructions(schema)
+                )
+                .build()
             )
             
-            response = await self._call_llm(prompt)
+            response = await self._call_llm(prompt, "lessons", payload_model=LessonsPayload)
             return self._parse_education_lessons(response, financial_level)
         except Exception as e:
             print(f"AI Service error in generate_personalized_lessons: {e}")
-            return self._parse_education_lessons("", financial_level)
+            return self._parse_education_lessons("", financial_level)[0], "fallback"
     
-    async def chat_with_advisor(self, user_message: str, user_profile: Dict[str, Any], chat_history: List[Dict[str, str]]) -> str:
+    async def generate_financial_plan(self, user_profile: Dict[str, Any]) -> Dict[str, Any]:
+        """Budget, investment, income and lesson sections from a single LLM call.
+        
+        One round trip instead of four; each section still goes through its
+        own parser, so a missing or malformed section falls back on its own.
+        Returns the plan dict; sections that fell back are named in ``fallback_sections``.
+        """
+        financial_level = user_profile.get('financial_level', 'beginner') or 'beginner'
         try:
-            # Build context from profile
-            profile_context = f"User: {user_profile.get('financial_level', 'beginner')} level, ${user_profile.get('monthly_income', 0)}/mo income, {user_profile.get('risk_tolerance', 'moderate')} risk tolerance."
-            
-            # Add recent history
-            history_text = ""
-            if chat_history:
-                recent = list(reversed(chat_history[-4:]))  # Last 4 messages
-                history_text = "\n".join([f"{msg.get('role', 'user')}: {msg.get('content', '')}" for msg in recent])
-            
-            prompt = f"""You are a personal financial advisor.
-{profile_context}
-
-Recent conversation:
-{history_text}
-
-User: {user_message}
-
-Provide personalized, actionable financial advice. Be supportive and educational."""
+            skills = user_profile.get('skills', [])
+            income = bucket_amount(user_profile.get('monthly_income', 0))
+            expenses = bucket_amount(user_profile.get('monthly_expenses', 0))
+            savings = bucket_amount(max(0, (user_profile.get('monthly_income', 0) or 0) - (user_profile.get('monthly_expenses', 0) or 0)))
+            risk_tolerance = user_profile.get('risk_tolerance', 'moderate') or 'moderate'
+            location = user_profile.get('location', '')
+            time_availability = user_profile.get('time_availability', '')
+            schema = (
+                f"{{ budget: {SCHEMA_HINTS['budget']}, investment: {SCHEMA_HINTS['investment']}, "
+                f"income: {SCHEMA_HINTS['income']}, lessons: {SCHEMA_HINTS['lessons']} }}"
+            )
+            prompt = (
+                self._prompt("plan")
+                .add(
+                    "You are a financial advisor. Build a complete financial plan for:\n"
+                    f"Level: {financial_level}\n"
+                    f"Risk: {risk_tolerance}\n"
+                    f"Income: ${income}/month\n"
+                    f"Expenses: ${expenses}/month\n"
+                    f"Monthly savings: ${savings}\n"
+                    f"Location: {location or 'any location'}\n"
+                    f"Time: {time_availability or 'flexible'}\n"
+                )
+                .add_optional(f"Skills: {', '.join(skills) if skills else 'general skills'}\n")
+                .add(
+                    "\nSections:\n"
+                    "budget: 3-5 spending leaks, actionable recommendations and estimated monthly savings.\n"
+                    "investment: specific recommendations with allocations, portfolio strategy and risk assessment.\n"
+                    "income: 3 specific, practical income opportunities.\n"
+                    "lessons: 4 practical lessons; category Basics/Budgeting/Investing/Advanced, "
+                    "content 1-2 sentences, duration 15-45 min, points 100-300."
+                    + self._json_instructions(schema)
+                )
+                .build()
+            )
+            inputs = {
+                "level": financial_level.lower(),
+                "risk": risk_tolerance.lower(),
+                "income": income,
+                "expenses": expenses,
+                "skills": normalize_skills(skills),
+                "location": (location or '').strip().lower(),
+                "time": (time_availability or '').strip().lower()
+            }
             
-            response = await self._call_llm(prompt)
+            key = self.response_cache.make_key("plan", inputs)
+            cached = await self.response_cache.get(key)
+            if cached is not None:
+                return cached
+            response = await self._call_llm(prompt, "plan", payload_model=FinancialPlanPayload)
+            plan, outcome = self._parse_financial_plan(response, financial_level)
+            # Same rule as _generate_cached: a truncated plan can lose items without any section falling back
+            if outcome in ("validated", "complete"):
+                await self.response_cache.set(key, plan)
+            return plan
+        except Exception as e:
+            print(f"AI Service error in generate_financial_plan: {e}")
+            return self._parse_financial_plan("", financial_level)[0]
+    
+    def _build_chat_prompt(self, user_message: str, user_profile: Dict[str, Any], chat_history: List[Dict[str, str]],
+                           conversation_summary: Optional[str] = None) -> str:
+        # Build context from profile
+        profile_context = f"User: {user_profile.get('financial_level', 'beginner')} level, ${user_profile.get('monthly_income', 0)}/mo income, {user_profile.get('risk_tolerance', 'moderate')} risk tolerance."
+        
+        # The rolling summary carries older turns; messages it doesn't cover yet are sent as they are
+        recent = list(reversed(chat_history[-4:])) if chat_history else []  # Last 4 messages
+        recent_text = "\n".join([f"{msg.get('role', 'user')}: {msg.get('content', '')}" for msg in recent])
+        
+        # Only history gives way, the summary before recent messages and oldest lines first;
+        # the question and instructions always fit
+        builder = self._prompt("chat").add(f"You are a personal financial advisor.\n{profile_context}\n")
+        if conversation_summary:
+            builder.add("\nConversation so far (summary):\n").add_optional(f"{conversation_summary}\n", priority=0, keep_tail=True)
+        if recent_text:
+            builder.add("\nRecent conversation:\n").add_optional(f"{recent_text}\n", priority=1, keep_tail=True)
+        return (
+            builder
+            .add(f"\nUser: {user_message}\n\nProvide personalized, actionable financial advice. Be supportive and educational.")
+            .build()
+        )
+    
+    async def chat_with_advisor(self, user_message: str, user_profile: Dict[str, Any], chat_history: List[Dict[str, str]],
+                                conversation_summary: Optional[str] = None) -> str:
+        try:
+            prompt = self._build_chat_prompt(user_message, user_profile, chat_history, conversation_summary)
+            response = await self._call_llm(prompt, "chat")
             return response if response else self._fallback_chat_reply(user_message, user_profile)
         except Exception as e:
             print(f"AI Service error in chat: {e}")
             return self._fallback_chat_reply(user_message, user_profile)
+    
+    async def stream_chat_with_advisor(self, user_message: str, user_profile: Dict[str, Any], chat_history: List[Dict[str, str]],
+                                       conversation_summary: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the advisor reply as Groq streams it; falls back to the offline reply if nothing arrives.
+        
+        If the upstream fails once part of the reply is out, ChatStreamInterrupted
+        is raised after the partial text, so callers never mistake it for a full reply.
+        """
+        emitted = False
+        try:
+            if not self.client:
+                raise RuntimeError("Groq client not initialized")
+            prompt = self._build_chat_prompt(user_message, user_profile, chat_history, conversation_summary)
+            limits = self.usage.limits_for("chat")
+            async with self.gateway.slot():
+                started = time.monotonic()
+                try:
+                    stream = await self.client.chat.completions.create(
+                        model=self.groq_model,
+                        messages=self._llm_messages(prompt),
+                        max_tokens=limits.max_tokens,
+                        temperature=limits.temperature,
+                        stream=True
+                    )
+                    finish_reason = None
+                    # Closing releases the pooled connection and stops generation if the client goes away mid-reply
+                    async with stream:
+                        async for chunk in stream:
+                            delta = chunk.choices[0].delta.content if chunk.choices else None
+                            if chunk.choices and chunk.choices[0].finish_reason:
+                                finish_reason = chunk.choices[0].finish_reason
+                            # Groq reports usage on the final chunk
+                            usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+                            if usage:
+                                self.usage.record("chat", usage.prompt_tokens, usage.completion_tokens, finish_reason == "length")
+                            if delta:
+                                emitted = True
+                                yield delta
+                except Exception as e:
+                    latency = time.monotonic() - started
+                    LLM_CALL_SECONDS.observe(latency, "chat", "error")
+                    self.health.record(False, latency)
+                    UPSTREAM_ERRORS.inc("groq", type(e).__name__)
+                    if _is_upstream_failure(e):
+                        self.gateway.record_failure()
+                    raise
+                latency = time.monotonic() - started
+                LLM_CALL_SECONDS.observe(latency, "chat", "ok" if emitted else "empty")
+                self.health.record(emitted, latency)
+                self.gateway.record_success()
+        except Exception as e:
+            self.last_error = f"Groq stream error: {type(e).__name__}: {str(e)}"
+            self.logger.error(self.last_error)
+            if emitted:
+                raise ChatStreamInterrupted(self.last_error) from e
+        if not emitted:
+            yield self._fallback_chat_reply(user_message, user_profile)
 
+    async def summarize_conversation(self, previous_summary: Optional[str], user_message: str, assistant_message: str,
+                                     max_chars: int = 1200) -> str:
+        """Fold the latest exchange into the rolling conversation summary."""
+        # The advisor reply is trimmed before the previous summary, which carries older context
+        prompt = (
+            self._prompt("summary")
+            .add("Update the running summary of a conversation between a user and their financial advisor.\nCurrent summary:\n")
+            .add_optional(f"{previous_summary or '(none yet)'}\n", priority=1, keep_tail=True)
+            .add(f"\nLatest exchange:\nUser: {user_message}\nAdvisor: ")
+            .add_optional(f"{assistant_message[:1500]}\n", priority=0)
+            .add(
+                "\nWrite the updated summary in at most 120 words. Keep the user's goals, figures, decisions and open questions; "
+                "drop pleasantries. Return only the summary text."
+            )
+            .build()
+        )
+        summary = await self._call_llm(prompt, "summary")
+        if not summary:
+            # Offline: keep a terse trail of the exchange so context isn't lost entirely
+            summary = "\n".join(filter(None, [
+                previous_summary, f"- User asked: {user_message[:200]}", f"- Advisor replied: {assistant_message[:200]}"
+            ]))
+        # Keep the most recent content if the summary outgrows its budget
+        return summary[-max_chars:]
+    
     def _fallback_chat_reply(self, user_message: str, user_profile: Dict[str, Any]) -> str:
         """Deterministic, API-free response so chat keeps working without OpenAI."""
+        FALLBACKS.inc("chat")
         risk = user_profile.get("risk_tolerance", "moderate") if user_profile else "moderate"
         income = user_profile.get("monthly_income", 0) if user_profile else 0
         expenses = user_profile.get("monthly_expenses", 0) if user_profile else 0
@@ -208,81 +747,181 @@ Provide personalized, actionable financial advice. Be supportive and educational
 
         return "\n".join(reply_lines)
     
-    async def _call_llm(self, prompt: str) -> str:
-        """Call Groq API (fast, free, reliable)"""
+    def _llm_messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": "You are a knowledgeable financial advisor. Provide concise, actionable advice."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _response_format(self, payload_model: Optional[Type[BaseModel]]) -> Optional[Dict[str, Any]]:
+        if payload_model is None or self.response_format not in ("json_object", "json_schema"):
+            return None
+        if self.response_format == "json_schema":
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": payload_model.__name__, "schema": _json_schema(payload_model)}
+            }
+        return {"type": "json_object"}
+    
+    def _note_format_rejection(self, response_format: Dict[str, Any], detail: str):
+        """Count a 400 sent back for a structured call; stop asking for a format the model does not support.
+        
+        ``json_validate_failed`` means the model broke JSON mode on one reply,
+        so the format is kept. Any other complaint about the format steps it
+        down for good: json_schema to json_object, json_object to off.
+        """
+        self.response_format_rejections += 1
+        detail = detail.lower()
+        if "json_validate_failed" in detail or not ("response_format" in detail or "not supported" in detail):
+            return
+        # Concurrent calls may all be rejected; only the first one steps the setting down
+        if self.response_format != response_format["type"]:
+            return
+        downgraded = "json_object" if response_format["type"] == "json_schema" else "off"
+        self.logger.warning(f"Groq rejected response_format {self.response_format}; using {downgraded} from now on")
+        self.response_format = downgraded
+    
+    def _salvage_failed_generation(self, body: Any, prompt: str, method: str) -> str:
+        """Partial output from a json_validate_failed 400, or "" when no JSON can be recovered from it.
+        
+        Groq rejects a JSON-mode reply that is invalid or cut off at max_tokens,
+        but returns what it generated in ``failed_generation``. The tolerant
+        parser can usually keep most of it, which saves sending the prompt again.
+        """
+        error = body.get("error", body) if isinstance(body, dict) else None
+        if not isinstance(error, dict) or error.get("code") != "json_validate_failed":
+            return ""
+        text = (error.get("failed_generation") or "").strip()
+        value, complete = extract_json(text)
+        if value is None:
+            return ""
+        # The error carries no usage block; estimates keep token totals and adaptive caps honest
+        self.usage.record(method, estimate_tokens(prompt), estimate_tokens(text), not complete)
+        self.gateway.record_success()
+        self.logger.info(f"Salvaged {len(text)} chars from a json_validate_failed reply for {method}")
+        return text
+    
+    async def _call_llm(self, prompt: str, method: str, payload_model: Optional[Type[BaseModel]] = None) -> str:
+        """Call Groq API; identical prompts already in flight share one request.
+        
+        ``method`` selects the generation limits and the bucket usage is recorded under. With
+        ``payload_model`` the call asks for structured output in the configured response format.
+        """
+        limits = self.usage.limits_for(method)
+        response_format = self._response_format(payload_model)
+        key = hashlib.sha256(f"{self.groq_model}\n{limits}\n{json.dumps(response_format)}\n{prompt}".encode()).hexdigest()
+        return await self._llm_flights.do(key, lambda: self._request_completion(prompt, method, limits, response_format))
+    
+    async def _request_completion(self, prompt: str, method: str, limits: GenerationLimits,
+                                  response_format: Optional[Dict[str, Any]] = None) -> str:
+        """Call Groq API (fast, free, reliable) through the gateway; returns "" when the call is shed or fails."""
+        try:
+            return await self._gated_completion(prompt, method, limits, response_format)
+        except GatewayRejectedError as e:
+            self.last_error = f"LLM gateway rejected call: {e}"
+            self.logger.warning(self.last_error)
+            return ""
+    
+    async def _gated_completion(self, prompt: str, method: str, limits: GenerationLimits,
+                                response_format: Optional[Dict[str, Any]] = None) -> str:
+        """One completion inside a gateway slot; raises GatewayRejectedError when the call is shed."""
+        async with self.gateway.slot():
+            started = time.monotonic()
+            text = await self._send_completion(prompt, method, limits, response_format)
+            latency = time.monotonic() - started
+            LLM_CALL_SECONDS.observe(latency, method, "ok" if text else "empty")
+            # Probes report through the monitor themselves; everything else is real traffic
+            if method != "probe":
+                self.health.record(bool(text), latency)
+            return text
+    
+    async def _probe_llm(self) -> str:
+        """Health probe; a shed call surfaces as GatewayRejectedError rather than an empty reply."""
+        return await self._gated_completion("Reply with OK.", "probe", self.usage.limits_for("probe"))
+    
+    async def _send_completion(self, prompt: str, method: str, limits: GenerationLimits,
+                               response_format: Optional[Dict[str, Any]] = None) -> str:
         if not self.client:
             self.logger.error("Groq client is None - API key missing? Falling back to HTTP call.")
-            # Fallback to direct HTTP call
-            try:
-                headers = {"Authorization": f"Bearer {self.groq_api_key}", "Content-Type": "application/json"}
-                payload = {
-                    "model": self.groq_model,
-                    "messages": [
-                        {"role": "system", "content": "You are a knowledgeable financial advisor. Provide concise, actionable advice."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "max_tokens": 500,
-                    "temperature": 0.7
-                }
-                resp = await self.http_client.post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=payload)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    text = data["choices"][0]["message"]["content"]
-                    self.logger.info(f"Groq HTTP OK: {text[:120].replace(chr(10),' ')}...")
-                    return text.strip()
-                else:
-                    self.last_error = f"Groq HTTP {resp.status_code}: {resp.text[:200]}"
-                    self.logger.error(self.last_error)
-                    return ""
-            except Exception as e:
-                self.last_error = f"Groq HTTP exception: {e}"
-                self.logger.error(self.last_error)
-                return ""
+            return await self._http_completion(prompt, method, limits, response_format)
         
         try:
             self.logger.debug(f"Calling Groq with prompt: {prompt[:80]}...")
             response = await self.client.chat.completions.create(
                 model=self.groq_model,
-                messages=[
-                    {"role": "system", "content": "You are a knowledgeable financial advisor. Provide concise, actionable advice."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
+                messages=self._llm_messages(prompt),
+                max_tokens=limits.max_tokens,
+                temperature=limits.temperature,
+                **({"response_format": response_format} if response_format else {})
             )
+            if response.usage:
+                self.usage.record(method, response.usage.prompt_tokens, response.usage.completion_tokens,
+                                  response.choices[0].finish_reason == "length")
             text = response.choices[0].message.content
             self.logger.info(f"Groq OK: {text[:120].replace(chr(10),' ')}...")
+            self.gateway.record_success()
             return text.strip()
         except Exception as e:
             self.last_error = f"Groq SDK error: {type(e).__name__}: {str(e)}"
             self.logger.error(self.last_error)
+            UPSTREAM_ERRORS.inc("groq", type(e).__name__)
+            if response_format and isinstance(e, APIStatusError) and e.status_code == 400:
+                # Unsupported format for this model, or the model broke JSON mode; the prompt still asks for JSON
+                self._note_format_rejection(response_format, str(e))
+                salvaged = self._salvage_failed_generation(e.body, prompt, method)
+                if salvaged:
+                    return salvaged
+                return await self._send_completion(prompt, method, limits)
+            if _is_upstream_failure(e):
+                # Repeating the call over raw HTTP would only double the load on a struggling upstream
+                self.gateway.record_failure()
+                return ""
             import traceback
             self.logger.error(traceback.format_exc())
-            # Try HTTP fallback once
-            try:
-                headers = {"Authorization": f"Bearer {self.groq_api_key}", "Content-Type": "application/json"}
-                payload = {
-                    "model": self.groq_model,
-                    "messages": [
-                        {"role": "system", "content": "You are a knowledgeable financial advisor. Provide concise, actionable advice."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    "max_tokens": 500,
-                    "temperature": 0.7
-                }
-                resp = await self.http_client.post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=payload)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    text = data["choices"][0]["message"]["content"]
-                    self.logger.info(f"Groq HTTP OK(after SDK fail): {text[:120].replace(chr(10),' ')}...")
-                    return text.strip()
-                else:
-                    self.last_error = f"Groq HTTP {resp.status_code}: {resp.text[:200]}"
-                    self.logger.error(self.last_error)
-            except Exception as e2:
-                self.last_error = f"Groq HTTP exception: {e2}"
-                self.logger.error(self.last_error)
-            return ""
+            # SDK-side problem: try HTTP fallback once
+            return await self._http_completion(prompt, method, limits, response_format)
+    
+    async def _http_completion(self, prompt: str, method: str, limits: GenerationLimits,
+                               response_format: Optional[Dict[str, Any]] = None) -> str:
+        try:
+            headers = {"Authorization": f"Bearer {self.groq_api_key}", "Content-Type": "application/json"}
+            payload = {
+                "model": self.groq_model,
+                "messages": self._llm_messages(prompt),
+                "max_tokens": limits.max_tokens,
+                "temperature": limits.temperature
+            }
+            if response_format:
+                payload["response_format"] = response_format
+            resp = await self.http_client.post("https://api.groq.com/openai/v1/chat/completions", headers=headers, json=payload)
+            if resp.status_code == 200:
+                data = resp.json()
+                usage = data.get("usage") or {}
+                self.usage.record(method, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0),
+                                  data["choices"][0].get("finish_reason") == "length")
+                text = data["choices"][0]["message"]["content"]
+                self.logger.info(f"Groq HTTP OK: {text[:120].replace(chr(10),' ')}...")
+                self.gateway.record_success()
+                return text.strip()
+            self.last_error = f"Groq HTTP {resp.status_code}: {resp.text[:200]}"
+            self.logger.error(self.last_error)
+            UPSTREAM_ERRORS.inc("groq", f"http_{resp.status_code}")
+            if response_format and resp.status_code == 400:
+                self._note_format_rejection(response_format, resp.text)
+                try:
+                    body = resp.json()
+                except ValueError:
+                    body = None
+                salvaged = self._salvage_failed_generation(body, prompt, method)
+                if salvaged:
+                    return salvaged
+                return await self._http_completion(prompt, method, limits)
+        except Exception as e:
+            self.last_error = f"Groq HTTP exception: {e}"
+            self.logger.error(self.last_error)
+            UPSTREAM_ERRORS.inc("groq", type(e).__name__)
+        self.gateway.record_failure()
+        return ""
     
     async def close(self):
         """Close clients if needed"""
@@ -292,8 +931,55 @@ Provide personalized, actionable financial advice. Be supportive and educational
         finally:
             await self.http_client.aclose()
     
-    def _parse_opportunities(self, response: str) -> List[Dict[str, Any]]:
-        data = self._safe_json_load(response)
+    def record_fallback(self, method: Optional[str]):
+        """Count a fallback served for ``method``; None for fallbacks already counted."""
+        if method:
+            self.json_stats.record_fallback(method)
+            FALLBACKS.inc(method)
+    
+    def fallback(self, section: str) -> Any:
+        """Canned data for a plan section ("budget", "investment", "income" or "opportunities").
+        
+        Not counted; callers that serve it call record_fallback themselves.
+        """
+        parsers = {
+            "budget": self._parse_budget_analysis,
+            "investment": self._parse_investment_advice,
+            "income": self._parse_opportunities,
+            "opportunities": self._parse_opportunity_scan
+        }
+        if section not in parsers:
+            raise ValueError(f"Unknown plan section: {section}")
+        return parsers[section]("", method=None)[0]
+    
+    def _parse_financial_plan(self, response: str, financial_level: str) -> Tuple[Dict[str, Any], str]:
+        """Split a combined plan into sections and run each through its single-section parser.
+        
+        Returns (plan, outcome): the _load_json outcome of the whole reply, or
+        "fallback" when any section fell back.
+        """
+        data, outcome = self._load_json(response, "plan")
+        if not isinstance(data, dict):
+            data = {}
+        sections = {name: json.dumps(data[name]) if data.get(name) else "" for name in ("budget", "investment", "income", "lessons")}
+        parsed = {
+            "budget": self._parse_budget_analysis(sections["budget"], method=None),
+            "investment": self._parse_investment_advice(sections["investment"], method=None),
+            "income": self._parse_opportunities(sections["income"], method=None),
+            "lessons": self._parse_education_lessons(sections["lessons"], financial_level, method=None)
+        }
+        # A section counts as a fallback when it was missing or its parser found nothing usable in it
+        fallback_sections = [name for name, (_, outcome) in parsed.items() if outcome == "fallback"]
+        if fallback_sections:
+            self.record_fallback("plan")
+            outcome = "fallback"
+        return {
+            **{name: result for name, (result, _) in parsed.items()},
+            "fallback_sections": fallback_sections
+        }, outcome
+    
+    def _parse_opportunities(self, response: str, method: Optional[str] = "income") -> Tuple[List[Dict[str, Any]], str]:
+        data, outcome = self._load_json(response, method)
         items = []
         if isinstance(data, dict) and isinstance(data.get("opportunities"), list):
             items = data["opportunities"]
@@ -301,6 +987,7 @@ Provide personalized, actionable financial advice. Be supportive and educational
             items = data
         if not items:
             # Fallback
+            self.record_fallback(method)
             return [
                 {
                     "title": "Freelance Consulting",
@@ -329,7 +1016,7 @@ Provide personalized, actionable financial advice. Be supportive and educational
                     "time_commitment": "Flexible",
                     "skills_required": ["driving", "time management"]
                 }
-            ]
+            ], "fallback"
         normalized = []
         for x in items[:3]:
             normalized.append({
@@ -341,17 +1028,18 @@ Provide personalized, actionable financial advice. Be supportive and educational
                 "time_commitment": x.get("time_commitment", ""),
                 "skills_required": x.get("skills_required", []) or []
             })
-        return normalized
+        return normalized, outcome
     
-    def _parse_budget_analysis(self, response: str) -> Dict[str, Any]:
-        data = self._safe_json_load(response)
+    def _parse_budget_analysis(self, response: str, method: Optional[str] = "budget") -> Tuple[Dict[str, Any], str]:
+        data, outcome = self._load_json(response, method)
         if isinstance(data, dict) and data.get("spending_leaks"):
             return {
                 "spending_leaks": data.get("spending_leaks", []),
                 "recommendations": data.get("recommendations", []),
                 "potential_savings": data.get("potential_savings", 0)
-            }
+            }, outcome
         # Fallback
+        self.record_fallback(method)
         return {
             "spending_leaks": [
                 {"category": "Subscriptions", "amount": 50, "description": "Unused streaming services"},
@@ -365,18 +1053,19 @@ Provide personalized, actionable financial advice. Be supportive and educational
                 "Set up automatic savings transfer on payday"
             ],
             "potential_savings": 350
-        }
+        }, "fallback"
     
-    def _parse_investment_advice(self, response: str) -> Dict[str, Any]:
-        data = self._safe_json_load(response)
+    def _parse_investment_advice(self, response: str, method: Optional[str] = "investment") -> Tuple[Dict[str, Any], str]:
+        data, outcome = self._load_json(response, method)
         if isinstance(data, dict) and data.get("recommendations"):
             return {
                 "level": data.get("level", "beginner"),
                 "recommendations": data.get("recommendations", []),
                 "risk_assessment": data.get("risk_assessment", ""),
                 "portfolio_suggestion": data.get("portfolio_suggestion", {})
-            }
+            }, outcome
         # Fallback
+        self.record_fallback(method)
         return {
             "level": "beginner",
             "recommendations": [
@@ -405,17 +1094,18 @@ Provide personalized, actionable financial advice. Be supportive and educational
                 "rebalance_frequency": "quarterly",
                 "expected_return": "6-8% annually"
             }
-        }
+        }, "fallback"
     
-    def _parse_opportunity_scan(self, response: str) -> Dict[str, Any]:
-        data = self._safe_json_load(response)
+    def _parse_opportunity_scan(self, response: str, method: Optional[str] = "scan") -> Tuple[Dict[str, Any], str]:
+        data, outcome = self._load_json(response, method)
         if isinstance(data, dict) and data.get("opportunities"):
             return {
                 "opportunities": data.get("opportunities", []),
                 "market_trends": data.get("market_trends", []),
                 "personalized_alerts": data.get("personalized_alerts", [])
-            }
+            }, outcome
         # Fallback
+        self.record_fallback(method)
         return {
             "opportunities": [
                 {
@@ -440,10 +1130,11 @@ Provide personalized, actionable financial advice. Be supportive and educational
                 "Your skills in data analysis are currently in top 10% demand",
                 "3 new freelance opportunities matching your profile this week"
             ]
-        }    
-    def _parse_education_lessons(self, response: str, financial_level: str) -> List[Dict[str, Any]]:
-        """Parse AI-generated education lessons with fallback"""
-        data = self._safe_json_load(response)
+        }, "fallback"
+    
+    def _parse_education_lessons(self, response: str, financial_level: str, method: Optional[str] = "lessons") -> Tuple[List[Dict[str, Any]], str]:
+        """Parse AI-generated education lessons with fallback; returns (lessons, outcome)"""
+        data, outcome = self._load_json(response, method)
         lessons = []
         
         if isinstance(data, dict) and isinstance(data.get("lessons"), list):
@@ -453,6 +1144,7 @@ Provide personalized, actionable financial advice. Be supportive and educational
         
         if not lessons:
             # Fallback lessons
+            self.record_fallback(method)
             return [
                 {
                     "id": "1",
@@ -490,14 +1182,15 @@ Provide personalized, actionable financial advice. Be supportive and educational
                     "duration_minutes": 45,
                     "points": 300
                 }
-            ]
+            ], "fallback"
         
-        # Normalize and add IDs
+        # Normalize and add stable IDs
         normalized = []
         for i, lesson in enumerate(lessons[:4], 1):
+            title = lesson.get("title", f"Lesson {i}")
             normalized.append({
-                "id": str(i),
-                "title": lesson.get("title", f"Lesson {i}"),
+                "id": lesson_id(financial_level, title),
+                "title": title,
                 "category": lesson.get("category", "General"),
                 "level": financial_level,
                 "content": lesson.get("content", "Financial education content"),
@@ -505,4 +1198,4 @@ Provide personalized, actionable financial advice. Be supportive and educational
                 "points": int(lesson.get("points", 100))
             })
         
-        return normalized
\ No newline at end of file
+        return normalized, outcome
\ No newline at end of file
@@ -1,11 +1,20 @@
 import os
 import jwt
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from passlib.context import CryptContext
 from fastapi import HTTPException, Header
-from typing import Optional
+from typing import Optional, Dict, Any, NamedTuple
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor; each +1 doubles hashing time. Existing hashes keep verifying at their own cost.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or os.environ.get('SECRET_KEY') or 'your-secret-key-change-in-production'
 ALGORITHM = "HS256"
@@ -17,6 +26,79 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+class PasswordHasher:
+    """Runs bcrypt on a bounded thread pool so hashing never blocks the event loop.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism
+    without the pickling overhead of a process pool. Once ``max_queue``
+    calls are pending, new ones are refused with a 503 rather than queueing
+    behind a burst of logins.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+        elapsed = time.perf_counter() - started
+        self.completed += 1
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "pending": self._pending,
+            "queued": max(0, self._pending - self.max_workers),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_ms": round(self.total_seconds / self.completed * 1000, 1) if self.completed else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 1)
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+password_hasher = PasswordHasher(
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1)))),
+    max_queue=int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '64'))
+)
+
+async def hash_password_async(password: str) -> str:
+    return await password_hasher.hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.verify(plain_password, hashed_password)
+
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -24,18 +106,168 @@ def create_access_token(data: dict) -> str:
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(authorization: Optional[str] = Header(None)) -> str:
+class TokenClaims(NamedTuple):
+    user_id: str
+    exp: float  # unix timestamp
+
+class VerifiedTokenCache:
+    """Bounded LRU of tokens that already passed signature verification.
+
+    Entries are keyed by a digest of the token, never the token itself, and
+    are dropped once the token expires. Revocations are held until the
+    revoked token would have expired anyway. With a MongoDB collection
+    attached they are also written there (a TTL index on ``exp`` drops them
+    at expiry) and every worker reloads the set every ``refresh_interval``
+    seconds, so a logout reaches the other workers and survives restarts.
+    """
+
+    def __init__(self, max_entries: int, refresh_interval: float = 30.0):
+        self.max_entries = max_entries
+        self.refresh_interval = refresh_interval
+        self.logger = logging.getLogger("VerifiedTokenCache")
+        self._entries: "OrderedDict[str, TokenClaims]" = OrderedDict()
+        self._revoked: Dict[str, float] = {}
+        self.store = None
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    def attach_store(self, collection):
+        """Persist revocations in a motor collection of {digest, exp} documents."""
+        self.store = collection
+
+    @staticmethod
+    def _digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[TokenClaims]:
+        key = self._digest(token)
+        claims = self._entries.get(key)
+        if claims is None:
+            self.misses += 1
+            return None
+        if claims.exp <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: TokenClaims):
+        key = self._digest(token)
+        self._entries[key] = claims
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def revoke(self, token: str, exp: float):
+        key = self._digest(token)
+        self._entries.pop(key, None)
+        now = time.time()
+        self._revoked = {digest: until for digest, until in self._revoked.items() if until > now}
+        self._revoked[key] = exp
+        if self.store is None:
+            return
+        try:
+            await self.store.update_one(
+                {"digest": key},
+                {"$set": {"digest": key, "exp": datetime.fromtimestamp(exp, timezone.utc)}},
+                upsert=True
+            )
+        except Exception as e:
+            # Only this worker would honour the revocation, so the logout is reported as failed
+            self.logger.error(f"Could not persist token revocation: {e}")
+            raise HTTPException(status_code=503, detail="Logout could not be recorded, please retry")
+
+    async def load_revocations(self) -> int:
+        """Merge unexpired revocations from the store into the in-process set; returns how many were read."""
+        if self.store is None:
+            return 0
+        try:
+            docs = await self.store.find(
+                {"exp": {"$gt": datetime.now(timezone.utc)}}, {"_id": 0, "digest": 1, "exp": 1}
+            ).to_list(None)
+        except Exception as e:
+            self.logger.warning(f"Could not load token revocations: {e}")
+            return 0
+        now = time.time()
+        revoked = {digest: until for digest, until in self._revoked.items() if until > now}
+        for doc in docs:
+            exp = doc["exp"]
+            if exp.tzinfo is None:
+                exp = exp.replace(tzinfo=timezone.utc)
+            revoked[doc["digest"]] = exp.timestamp()
+        self._revoked = revoked
+        return len(docs)
+
+    def start(self):
+        if self.store is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.load_revocations()
+
+    def is_revoked(self, token: str) -> bool:
+        until = self._revoked.get(self._digest(token))
+        return until is not None and until > time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "revoked": len(self._revoked),
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+token_cache = VerifiedTokenCache(
+    max_entries=int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', '10000')),
+    refresh_interval=float(os.environ.get('TOKEN_REVOCATION_REFRESH', '30'))
+)
+
+async def verify_token_claims(authorization: Optional[str] = Header(None)) -> TokenClaims:
+    """Dependency returning the verified claims, skipping jwt.decode for recently verified tokens."""
     if not authorization:
         raise HTTPException(status_code=401, detail="Authorization header missing")
     
+    token = authorization.replace("Bearer ", "")
+    if token_cache.is_revoked(token):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    
     try:
-        token = authorization.replace("Bearer ", "")
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("user_id")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return user_id
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    user_id: str = payload.get("user_id")
+    if user_id is None:
         raise HTTPException(status_code=401, detail="Invalid token")
+    
+    claims = TokenClaims(user_id=user_id, exp=float(payload["exp"]))
+    token_cache.put(token, claims)
+    return claims
+
+async def verify_token(authorization: Optional[str] = Header(None)) -> str:
+    claims = await verify_token_claims(authorization)
+    return claims.user_id
+
+async def revoke_token(authorization: str, claims: TokenClaims):
+    await token_cache.revoke(authorization.replace("Bearer ", ""), claims.exp)
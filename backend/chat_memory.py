@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import weakref
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+class ConversationMemory:
+    """Rolling per-user conversation summary kept in the chat_summaries collection.
+
+    After each chat turn the summary is folded forward by the advisor in a
+    background task, so the reply never waits on it. Updates for one user
+    are serialized so quick successive turns can't overwrite each other.
+    Each summary records the timestamp of the last message it covers, so
+    turns it hasn't caught up with yet can be sent alongside it verbatim.
+    """
+
+    def __init__(self, db, advisor, max_chars: int):
+        self.db = db
+        self.advisor = advisor
+        self.max_chars = max_chars
+        self.logger = logging.getLogger("ConversationMemory")
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def get_summary(self, user_id: str) -> Optional[str]:
+        doc = await self.db.chat_summaries.find_one({"user_id": user_id}, {"_id": 0, "summary": 1})
+        return doc.get("summary") if doc else None
+
+    async def get_context(self, user_id: str, recent_limit: int) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+        """The summary plus up to ``recent_limit`` of the newest messages it doesn't cover, newest first."""
+        doc = await self.db.chat_summaries.find_one(
+            {"user_id": user_id}, {"_id": 0, "summary": 1, "covers_until": 1, "updated_at": 1}
+        )
+        summary = doc.get("summary") if doc else None
+        query: Dict[str, Any] = {"user_id": user_id}
+        # Summaries written before covers_until existed fall back to their write time
+        covered = (doc.get("covers_until") or doc.get("updated_at")) if summary else None
+        if covered:
+            query["timestamp"] = {"$gt": covered}
+        recent = await self.db.chat_messages.find(query, {"_id": 0}).sort("timestamp", -1).limit(recent_limit).to_list(recent_limit)
+        return summary, recent
+
+    def schedule_update(self, user_id: str, user_message: str, assistant_message: str, covers_until: datetime):
+        """Fold one exchange into the summary; ``covers_until`` is the timestamp of its last message."""
+        task = asyncio.create_task(self._update(user_id, user_message, assistant_message, covers_until))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update(self, user_id: str, user_message: str, assistant_message: str, covers_until: datetime):
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[user_id] = lock
+        async with lock:
+            try:
+                previous = await self.get_summary(user_id)
+                summary = await self.advisor.summarize_conversation(
+                    previous, user_message, assistant_message, max_chars=self.max_chars
+                )
+                await self.db.chat_summaries.update_one(
+                    {"user_id": user_id},
+                    {
+                        "$set": {"summary": summary, "covers_until": covers_until, "updated_at": datetime.now(timezone.utc)},
+                        "$inc": {"turns": 1}
+                    },
+                    upsert=True
+                )
+            except Exception as e:
+                self.logger.error(f"Conversation summary update failed for {user_id}: {e}")
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,73 @@
+import logging
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError, ServerSelectionTimeoutError
+
+logger = logging.getLogger("db_indexes")
+
+def _per_user_history(time_field: str) -> List[IndexModel]:
+    # id breaks timestamp ties for keyset pagination; the prefix still serves plain "latest" sorts
+    return [IndexModel(
+        [("user_id", ASCENDING), (time_field, DESCENDING), ("id", DESCENDING)],
+        name=f"user_id_{time_field}_id_desc"
+    )]
+
+# Every index the handlers rely on, by collection. Names are fixed so reruns are no-ops.
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "financial_profiles": [IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True)],
+    "user_progress": [IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True)],
+    "budget_analyses": _per_user_history("created_at"),
+    "investment_advice": _per_user_history("created_at"),
+    "opportunity_scans": _per_user_history("created_at"),
+    "income_opportunities": _per_user_history("created_at"),
+    "chat_messages": _per_user_history("timestamp"),
+    "chat_summaries": [IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True)],
+    "lessons": [
+        IndexModel([("level", ASCENDING), ("fingerprint", ASCENDING)], name="level_fingerprint_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "ai_response_cache": [
+        IndexModel([("key", ASCENDING)], name="key_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "revoked_tokens": [
+        IndexModel([("digest", ASCENDING)], name="digest_unique", unique=True),
+        IndexModel([("exp", ASCENDING)], name="exp_ttl", expireAfterSeconds=0),
+    ],
+}
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create any missing indexes and return the index names present per collection.
+
+    Safe to run on every startup: create_indexes is a no-op for indexes that
+    already exist with the same spec. A failing index (e.g. a unique index
+    over existing duplicates) is logged and skipped so the app still starts.
+    """
+    for collection, models in INDEX_SPECS.items():
+        for model in models:
+            try:
+                await db[collection].create_indexes([model])
+            except ServerSelectionTimeoutError as e:
+                logger.error(f"MongoDB unreachable, skipping index bootstrap: {e}")
+                return {}
+            except PyMongoError as e:
+                logger.error(f"Could not create index {model.document['name']} on {collection}: {e}")
+
+    report = await describe_indexes(db)
+    for collection, names in report.items():
+        logger.info(f"Indexes on {collection}: {', '.join(names)}")
+    return report
+
+async def describe_indexes(db) -> Dict[str, List[str]]:
+    report = {}
+    for collection in INDEX_SPECS:
+        try:
+            report[collection] = sorted((await db[collection].index_information()).keys())
+        except PyMongoError as e:
+            logger.error(f"Could not list indexes on {collection}: {e}")
+            report[collection] = []
+    return report
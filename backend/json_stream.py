@@ -0,0 +1,161 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+class JSONStreamParser:
+    """Tolerant, incremental extractor for the JSON value in an LLM reply.
+
+    ``feed`` text as it arrives; the parser skips leading prose or code
+    fences, tracks nesting and string state across chunks, and ignores
+    anything after the top-level value closes. ``result`` returns the value
+    once it is complete, or else the longest prefix that can be closed into
+    valid JSON: a reply cut off at max_tokens inside the third of three
+    opportunities still yields the first two. Array elements are only kept
+    whole, so a half-written object is dropped rather than returned with
+    missing fields. ``openers`` limits which brackets may start the value.
+    """
+
+    def __init__(self, openers: str = "{["):
+        self.openers = openers
+        self.text = ""
+        self.complete = False
+        self._value: Any = None
+        self._pos = 0
+        self._reset()
+
+    def _reset(self):
+        self._start: Optional[int] = None
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        # Latest (end, closers) cut that closes into valid JSON
+        self._safe: Optional[Tuple[int, str]] = None
+
+    def feed(self, chunk: str) -> bool:
+        """Consume another piece of the reply; returns True once the top-level value is complete."""
+        if self.complete or not chunk:
+            return self.complete
+        self.text += chunk
+        self._scan()
+        return self.complete
+
+    def result(self) -> Tuple[Any, bool]:
+        """(value, complete); value is the recovered prefix when incomplete, or None if nothing usable."""
+        if self.complete:
+            return self._value, True
+        if self._start is None or self._safe is None:
+            return None, False
+        end, closers = self._safe
+        try:
+            return json.loads(self.text[self._start:end] + closers, strict=False), False
+        except ValueError:
+            return None, False
+
+    def _scan(self):
+        text = self.text
+        i = self._pos
+        while i < len(text):
+            ch = text[i]
+            if self._start is None:
+                if ch in self.openers:
+                    self._start = i
+                    self._stack.append(ch)
+                    self._mark(i + 1)
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in _CLOSERS:
+                self._stack.append(ch)
+                self._mark(i + 1)
+            elif ch in "}]":
+                self._stack.pop()
+                if not self._stack:
+                    if self._finish(i + 1):
+                        self._pos = i + 1
+                        return
+                    # Bracketed prose rather than JSON; look for the next opening bracket
+                    i = self._start + 1
+                    self._reset()
+                    continue
+                self._mark(i + 1)
+            elif ch == ",":
+                self._mark(i)
+            i += 1
+        self._pos = i
+
+    def _mark(self, end: int):
+        # Skip cuts that would leave a partial object as an array element
+        for outer, inner in zip(self._stack, self._stack[1:]):
+            if outer == "[" and inner == "{":
+                return
+        self._safe = (end, "".join(_CLOSERS[c] for c in reversed(self._stack)))
+
+    def _finish(self, end: int) -> bool:
+        try:
+            self._value = json.loads(self.text[self._start:end], strict=False)
+        except ValueError:
+            return False
+        self.complete = True
+        return True
+
+def _extract(text: str, openers: str) -> Tuple[Any, bool]:
+    parser = JSONStreamParser(openers)
+    parser.feed(text or "")
+    return parser.result()
+
+def extract_json(text: str) -> Tuple[Any, bool]:
+    """One-shot form of JSONStreamParser: (value, complete) for a whole reply.
+
+    A leading "[3]" in prose is valid JSON too, so an array holding no
+    objects gives way to an object found later in the text.
+    """
+    value, complete = _extract(text, "{[")
+    if isinstance(value, list) and not any(isinstance(item, dict) for item in value):
+        found = _extract(text, "{")
+        if found[0] is not None:
+            return found
+    return value, complete
+
+class ParseStats:
+    """Per-method outcome counts for structured replies.
+
+    ``validated`` matched the reply schema as-is, ``complete`` parsed as
+    JSON without matching it, ``recovered`` was salvaged from a truncated or
+    malformed reply, ``failed`` had nothing usable, and ``empty`` means no
+    reply arrived at all. ``fallbacks`` counts the times the caller served
+    static data instead, for whatever reason.
+    """
+
+    OUTCOMES = ("validated", "complete", "recovered", "failed", "empty")
+
+    def __init__(self):
+        self._methods: Dict[str, Dict[str, int]] = {}
+
+    def _counts(self, method: str) -> Dict[str, int]:
+        return self._methods.setdefault(method, dict.fromkeys(self.OUTCOMES + ("fallbacks",), 0))
+
+    def record(self, method: str, outcome: str):
+        self._counts(method)[outcome] += 1
+
+    def record_fallback(self, method: str):
+        self._counts(method)["fallbacks"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for method, counts in self._methods.items():
+            replies = counts["validated"] + counts["complete"] + counts["recovered"] + counts["failed"]
+            parses = replies + counts["empty"]
+            report[method] = {
+                **counts,
+                "recovered_rate": round(counts["recovered"] / replies, 3) if replies else 0.0,
+                "discarded_rate": round(counts["failed"] / replies, 3) if replies else 0.0,
+                "fallback_rate": round(counts["fallbacks"] / parses, 3) if parses else 0.0
+            }
+        return report
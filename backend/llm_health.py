@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, Type
+
+class LLMHealthMonitor:
+    """Cached view of LLM health, built from real traffic plus a slow probe.
+
+    Completions report their outcome and latency through ``record``; status
+    is the success rate and latency over the last ``window`` seconds. When
+    traffic is too thin to judge, the most recent synthetic probe decides.
+    The background probe only fires when no call has succeeded for a whole
+    ``probe_interval``, so a busy server never spends quota on it. A probe
+    that raises one of ``rejections`` never reached the provider (e.g. the
+    gateway's breaker is open) and is reported as ``gateway_rejected``.
+    """
+
+    MIN_SAMPLES = 5
+
+    def __init__(self, probe: Callable[[], Awaitable[str]],
+                 rejections: Tuple[Type[BaseException], ...] = ()):
+        self.probe_fn = probe
+        self.rejections = rejections
+        self.window = float(os.environ.get('LLM_HEALTH_WINDOW', '300'))
+        self.probe_interval = float(os.environ.get('LLM_HEALTH_PROBE_INTERVAL', '300'))
+        self.probe_timeout = float(os.environ.get('LLM_HEALTH_PROBE_TIMEOUT', '10'))
+        self.logger = logging.getLogger("LLMHealthMonitor")
+        # (monotonic time, succeeded, latency seconds)
+        self._samples: Deque[Tuple[float, bool, float]] = deque(maxlen=1000)
+        self._last_success: Optional[float] = None
+        self.last_probe: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, succeeded: bool, latency: float):
+        now = time.monotonic()
+        self._samples.append((now, succeeded, latency))
+        if succeeded:
+            self._last_success = now
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            if self._last_success is not None and time.monotonic() - self._last_success < self.probe_interval:
+                continue
+            try:
+                await self.probe()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"LLM health probe crashed: {e}")
+
+    async def probe(self) -> Dict[str, Any]:
+        """Run one live completion and remember its outcome."""
+        started = time.monotonic()
+        rejected = False
+        try:
+            sample = await asyncio.wait_for(self.probe_fn(), timeout=self.probe_timeout)
+            error = None if sample else "empty reply"
+        except asyncio.TimeoutError:
+            sample, error = "", f"timed out after {self.probe_timeout}s"
+        except self.rejections as e:
+            sample, error, rejected = "", f"gateway rejected: {e}", True
+        latency = time.monotonic() - started
+        self.last_probe = {
+            "ok": error is None,
+            "rejected": rejected,
+            "latency_ms": round(latency * 1000, 1),
+            "sample": sample[:160],
+            "error": error,
+            "at": datetime.now(timezone.utc).isoformat()
+        }
+        if error:
+            self.logger.warning(f"LLM health probe failed: {error}")
+        return self.last_probe
+
+    def status(self) -> Dict[str, Any]:
+        cutoff = time.monotonic() - self.window
+        recent = [(ok, latency) for at, ok, latency in self._samples if at >= cutoff]
+        successes = [latency for ok, latency in recent if ok]
+        success_rate = len(successes) / len(recent) if recent else None
+
+        if len(recent) >= self.MIN_SAMPLES:
+            state = "up" if success_rate >= 0.9 else "degraded" if success_rate >= 0.5 else "down"
+        elif self.last_probe is not None:
+            state = ("up" if self.last_probe["ok"]
+                     else "gateway_rejected" if self.last_probe["rejected"] else "down")
+        else:
+            state = "unknown"
+
+        return {
+            "status": state,
+            "window_seconds": self.window,
+            "calls": len(recent),
+            "success_rate": round(success_rate, 3) if success_rate is not None else None,
+            "latency_ms": {
+                "p50": self._percentile_ms(successes, 0.5),
+                "p95": self._percentile_ms(successes, 0.95)
+            },
+            "last_probe": self.last_probe
+        }
+
+    @staticmethod
+    def _percentile_ms(latencies, fraction: float) -> Optional[float]:
+        if not latencies:
+            return None
+        ordered = sorted(latencies)
+        return round(ordered[min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1)] * 1000, 1)
@@ -0,0 +1,113 @@
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional
+
+@dataclass(frozen=True)
+class GenerationLimits:
+    max_tokens: int
+    temperature: float = 0.7
+
+# Declared per advisor method; sized for the reply each prompt asks for
+DEFAULT_LIMITS: Dict[str, GenerationLimits] = {
+    "income": GenerationLimits(max_tokens=700, temperature=0.7),
+    "budget": GenerationLimits(max_tokens=500, temperature=0.5),
+    "investment": GenerationLimits(max_tokens=600, temperature=0.5),
+    "scan": GenerationLimits(max_tokens=600, temperature=0.7),
+    "lessons": GenerationLimits(max_tokens=900, temperature=0.7),
+    "plan": GenerationLimits(max_tokens=1800, temperature=0.5),
+    "chat": GenerationLimits(max_tokens=500, temperature=0.7),
+    "summary": GenerationLimits(max_tokens=250, temperature=0.3),
+    "probe": GenerationLimits(max_tokens=5, temperature=0.0),
+}
+
+def parse_limit_overrides(raw: str) -> Dict[str, GenerationLimits]:
+    """Parse "chat=400:0.6,plan=2000" into limits; a missing temperature keeps the default's."""
+    overrides = {}
+    for item in raw.split(','):
+        method, _, spec = item.partition('=')
+        method = method.strip().lower()
+        if not method or not spec.strip():
+            continue
+        max_tokens, _, temperature = spec.partition(':')
+        base = DEFAULT_LIMITS.get(method, GenerationLimits(max_tokens=500))
+        overrides[method] = GenerationLimits(
+            max_tokens=int(max_tokens),
+            temperature=float(temperature) if temperature.strip() else base.temperature
+        )
+    return overrides
+
+class UsageTracker:
+    """Per-method token accounting, plus adaptive completion caps.
+
+    Every completion records its prompt and completion tokens and whether it
+    was cut off at the cap. With ``adaptive`` on, once a method has
+    ``min_samples`` recent completions its cap becomes the observed 95th
+    percentile times ``headroom``, bounded below by ``floor`` (or the
+    declared limit, if that is smaller) and above by twice the declared
+    limit. Short replies get a tight cap; replies that hit the cap pull the
+    percentile up, so a method that keeps truncating grows its cap until
+    the replies fit.
+    """
+
+    def __init__(self, limits: Dict[str, GenerationLimits], adaptive: bool, window: int = 200,
+                 min_samples: int = 20, headroom: float = 1.25, floor: int = 64):
+        self.limits = limits
+        self.adaptive = adaptive
+        self.window = window
+        self.min_samples = min_samples
+        self.headroom = headroom
+        self.floor = floor
+        self._methods: Dict[str, Dict[str, int]] = {}
+        self._recent: Dict[str, Deque[int]] = {}
+
+    def declared(self, method: str) -> GenerationLimits:
+        return self.limits.get(method) or GenerationLimits(max_tokens=500)
+
+    def limits_for(self, method: str) -> GenerationLimits:
+        declared = self.declared(method)
+        cap = self.adaptive_cap(method)
+        if cap is None:
+            return declared
+        return GenerationLimits(max_tokens=cap, temperature=declared.temperature)
+
+    def adaptive_cap(self, method: str) -> Optional[int]:
+        recent = self._recent.get(method)
+        if not self.adaptive or not recent or len(recent) < self.min_samples:
+            return None
+        ordered = sorted(recent)
+        p95 = ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+        declared = self.declared(method).max_tokens
+        # A method declared below the floor (the 5-token probe) keeps its own limit as the floor
+        floor = min(self.floor, declared)
+        return max(floor, min(2 * declared, math.ceil(p95 * self.headroom)))
+
+    def record(self, method: str, prompt_tokens: int, completion_tokens: int, truncated: bool):
+        stats = self._methods.setdefault(method, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "truncated": 0})
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt_tokens or 0
+        stats["completion_tokens"] += completion_tokens or 0
+        if truncated:
+            stats["truncated"] += 1
+        if completion_tokens:
+            self._recent.setdefault(method, deque(maxlen=self.window)).append(completion_tokens)
+
+    def totals(self) -> Dict[str, int]:
+        totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "truncated": 0}
+        for stats in self._methods.values():
+            for field in totals:
+                totals[field] += stats[field]
+        return totals
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for method in sorted(set(self.limits) | set(self._methods)):
+            stats = self._methods.get(method, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "truncated": 0})
+            calls = stats["calls"]
+            report[method] = {
+                **stats,
+                "avg_completion_tokens": round(stats["completion_tokens"] / calls, 1) if calls else 0.0,
+                "declared_max_tokens": self.declared(method).max_tokens,
+                "max_tokens": self.limits_for(method).max_tokens
+            }
+        return report
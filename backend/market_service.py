@@ -1,52 +1,286 @@
 import os
-import requests
-from typing import Dict, Any, List
+import time
+import asyncio
+import logging
+import httpx
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
 from dotenv import load_dotenv
 from pathlib import Path
 
+from singleflight import SingleFlight
+from metrics import MARKET_FETCH_SECONDS, UPSTREAM_ERRORS
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Major indices and popular stocks shown on the market overview
+OVERVIEW_SYMBOLS = ["SPY", "QQQ", "AAPL", "MSFT", "GOOGL", "AMZN", "TSLA", "NVDA"]
+
+def _parse_ttl_overrides(raw: str) -> Dict[str, float]:
+    """Parse "SPY:30,TSLA:15" into {"SPY": 30.0, "TSLA": 15.0}."""
+    overrides = {}
+    for item in raw.split(','):
+        symbol, _, ttl = item.partition(':')
+        if symbol.strip() and ttl.strip():
+            overrides[symbol.strip().upper()] = float(ttl)
+    return overrides
+
+class UpstreamRejected(Exception):
+    """Alpha Vantage answered 200 but with a throttle notice or error body instead of data."""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+def _quote_error_code(error: BaseException) -> str:
+    """A fixed code for a failed fetch; exception text can carry the request URL and API key."""
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, UpstreamRejected):
+        return error.code
+    if isinstance(error, httpx.HTTPStatusError):
+        return f"http_{error.response.status_code}"
+    return "upstream_error"
+
+class QuoteCache:
+    """In-process LRU cache of quotes with per-symbol TTLs.
+
+    An entry is fresh until its TTL elapses, then stale for a further
+    ``stale_ttl`` seconds during which it can still be served while a refresh
+    runs in the background. Past that window it counts as a miss.
+    """
+
+    def __init__(self, default_ttl: float, stale_ttl: float, max_entries: int, ttl_overrides: Optional[Dict[str, float]] = None):
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.ttl_overrides = ttl_overrides or {}
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float, float]]" = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def ttl_for(self, symbol: str) -> float:
+        return self.ttl_overrides.get(symbol.upper(), self.default_ttl)
+
+    def get(self, symbol: str) -> Tuple[Optional[Dict[str, Any]], str]:
+        """Return (quote, state) where state is "fresh", "stale" or "miss"."""
+        key = symbol.upper()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None, "miss"
+        quote, stored_at, ttl = entry
+        age = time.monotonic() - stored_at
+        if age < ttl:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(quote), "fresh"
+        if age < ttl + self.stale_ttl:
+            self._entries.move_to_end(key)
+            self.stale_hits += 1
+            return dict(quote), "stale"
+        del self._entries[key]
+        self.misses += 1
+        return None, "miss"
+
+    def peek(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """The quote if it is fresh or stale, without counting a lookup or touching LRU order."""
+        entry = self._entries.get(symbol.upper())
+        if entry is None:
+            return None
+        quote, stored_at, ttl = entry
+        return dict(quote) if time.monotonic() - stored_at < ttl + self.stale_ttl else None
+
+    def set(self, symbol: str, quote: Dict[str, Any], ttl: Optional[float] = None):
+        key = symbol.upper()
+        self._entries[key] = (dict(quote), time.monotonic(), ttl if ttl is not None else self.ttl_for(key))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0
+        }
+
 class MarketDataService:
     def __init__(self):
         self.alpha_vantage_key = os.environ.get('ALPHA_VANTAGE_API_KEY') or os.environ.get('ALPHA_VANTAGE_KEY')
         self.base_url = "https://www.alphavantage.co/query"
-    
-    def get_stock_quote(self, symbol: str) -> Dict[str, Any]:
+        self.max_concurrency = int(os.environ.get('MARKET_MAX_CONCURRENCY', '4'))
+        self.quote_timeout = float(os.environ.get('MARKET_QUOTE_TIMEOUT', '10'))
+        self.max_batch_size = int(os.environ.get('MARKET_BATCH_MAX', '20'))
+        self.logger = logging.getLogger("MarketDataService")
+        # One pooled client shared by every request; connections are reused across calls
+        self.http_client = httpx.AsyncClient(
+            timeout=self.quote_timeout,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency
+            )
+        )
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.quote_cache = QuoteCache(
+            default_ttl=float(os.environ.get('MARKET_CACHE_TTL', '60')),
+            stale_ttl=float(os.environ.get('MARKET_CACHE_STALE_TTL', '300')),
+            max_entries=int(os.environ.get('MARKET_CACHE_MAX_ENTRIES', '256')),
+            ttl_overrides=_parse_ttl_overrides(os.environ.get('MARKET_CACHE_TTL_OVERRIDES', ''))
+        )
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._quote_flights = SingleFlight()
+        # Symbols come straight from request paths, so only known ones become metric labels
+        self.max_symbol_labels = int(os.environ.get('MARKET_METRIC_MAX_SYMBOLS', '100'))
+        self._labelled_symbols = set(OVERVIEW_SYMBOLS)
+
+    async def _query(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        # The timeout covers the upstream call only, not time spent queued on the semaphore
+        async with self._semaphore:
+            response = await asyncio.wait_for(
+                self.http_client.get(self.base_url, params={**params, "apikey": self.alpha_vantage_key}),
+                timeout=self.quote_timeout
+            )
+        response.raise_for_status()
+        return response.json()
+
+    async def _fetch_quote(self, symbol: str) -> Dict[str, Any]:
+        """Fetch a single quote, raising on transport errors or timeouts.
+
+        Concurrent fetches of the same symbol share one upstream call.
+        """
+        return await self._quote_flights.do(symbol.upper(), lambda: self._request_quote(symbol))
+
+    async def _request_quote(self, symbol: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        outcome = "error"
         try:
-            params = {
-                "function": "GLOBAL_QUOTE",
-                "symbol": symbol,
-                "apikey": self.alpha_vantage_key
-            }
-            response = requests.get(self.base_url, params=params, timeout=10)
-            data = response.json()
-            
+            data = await self._query({"function": "GLOBAL_QUOTE", "symbol": symbol})
             if "Global Quote" in data and data["Global Quote"]:
                 quote = data["Global Quote"]
+                outcome = "ok"
                 return {
                     "symbol": symbol,
                     "price": float(quote.get("05. price", 0)),
                     "change_percent": float(quote.get("10. change percent", "0%").replace("%", "")),
                     "volume": float(quote.get("06. volume", 0))
                 }
+            # Throttling and bad calls come back as HTTP 200 with a message instead of a quote
+            if "Note" in data or "Information" in data:
+                outcome = "rate_limited"
+                raise UpstreamRejected("rate_limited", data.get("Note") or data.get("Information"))
+            if "Error Message" in data:
+                raise UpstreamRejected("upstream_error", data["Error Message"])
+            outcome = "not_found"
+            return {"symbol": symbol, "price": 0, "change_percent": 0}
+        except Exception as e:
+            UPSTREAM_ERRORS.inc("alpha_vantage", type(e).__name__)
+            raise
+        finally:
+            MARKET_FETCH_SECONDS.observe(time.perf_counter() - started, self._symbol_label(symbol, outcome), outcome)
+
+    def _symbol_label(self, symbol: str, outcome: str) -> str:
+        """Overview symbols plus symbols that have returned a quote, up to a cap; everything else is "other"."""
+        symbol = symbol.upper()
+        if symbol in self._labelled_symbols:
+            return symbol
+        if outcome == "ok" and len(self._labelled_symbols) < self.max_symbol_labels:
+            self._labelled_symbols.add(symbol)
+            return symbol
+        return "other"
+
+    async def get_stock_quote(self, symbol: str) -> Dict[str, Any]:
+        cached, state = self.quote_cache.get(symbol)
+        if state == "fresh":
+            return cached
+        if state == "stale":
+            # Serve the stale quote now and let a single background task refresh it
+            self._schedule_refresh(symbol)
+            return cached
+        return await self._load_quote(symbol)
+
+    def _schedule_refresh(self, symbol: str):
+        key = symbol.upper()
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._load_quote(symbol))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def refresh_quote(self, symbol: str) -> Dict[str, Any]:
+        """Bypass the cache and fetch a fresh quote for the symbol."""
+        return await self._load_quote(symbol)
+
+    async def _fetch_and_cache(self, symbol: str) -> Dict[str, Any]:
+        """Fetch a quote from upstream and cache it; failed lookups are not cached."""
+        quote = await self._fetch_quote(symbol)
+        if quote["price"] > 0:
+            self.quote_cache.set(symbol, quote)
+        return quote
+
+    async def _load_quote(self, symbol: str) -> Dict[str, Any]:
+        try:
+            return await self._fetch_and_cache(symbol)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Timed out fetching stock quote for {symbol}")
             return {"symbol": symbol, "price": 0, "change_percent": 0}
         except Exception as e:
-            print(f"Error fetching stock quote: {e}")
+            self.logger.error(f"Error fetching stock quote for {symbol}: {e}")
             return {"symbol": symbol, "price": 0, "change_percent": 0}
-    
-    def get_market_overview(self) -> List[Dict[str, Any]]:
-        # Get quotes for major indices and popular stocks
-        symbols = ["SPY", "QQQ", "AAPL", "MSFT", "GOOGL", "AMZN", "TSLA", "NVDA"]
-        overview = []
-        
-        for symbol in symbols:
-            quote = self.get_stock_quote(symbol)
-            if quote["price"] > 0:
-                overview.append(quote)
-        
-        return overview
-    
+
+    async def get_quotes(self, symbols: List[str]) -> List[Dict[str, Any]]:
+        """Quotes for a batch of symbols, one entry per unique symbol in input order.
+
+        Cached quotes are served as-is and only the misses go upstream,
+        concurrently. Every entry carries a ``status`` of "ok", "not_found"
+        or "error" so one bad symbol doesn't fail the whole batch; errors
+        also carry a fixed ``error`` code such as "timeout", "rate_limited"
+        or "http_429".
+        """
+        unique = list(dict.fromkeys(symbol.strip().upper() for symbol in symbols if symbol and symbol.strip()))
+        if len(unique) > self.max_batch_size:
+            raise ValueError(f"At most {self.max_batch_size} symbols per request")
+
+        results: Dict[str, Dict[str, Any]] = {}
+        misses = []
+        for symbol in unique:
+            cached, state = self.quote_cache.get(symbol)
+            if state == "miss":
+                misses.append(symbol)
+                continue
+            if state == "stale":
+                self._schedule_refresh(symbol)
+            results[symbol] = {**cached, "status": "ok"}
+
+        fetched = await asyncio.gather(*(self._fetch_and_cache(symbol) for symbol in misses), return_exceptions=True)
+        for symbol, outcome in zip(misses, fetched):
+            if isinstance(outcome, BaseException):
+                error = _quote_error_code(outcome)
+                self.logger.error(f"Error fetching stock quote for {symbol}: {outcome!r}")
+                results[symbol] = {"symbol": symbol, "price": 0, "change_percent": 0, "status": "error", "error": error}
+            elif outcome["price"] > 0:
+                results[symbol] = {**outcome, "status": "ok"}
+            else:
+                results[symbol] = {**outcome, "status": "not_found"}
+
+        return [results[symbol] for symbol in unique]
+
+    def cached_quotes(self, symbols: List[str]) -> List[Dict[str, Any]]:
+        """Whatever the quote cache holds for the symbols, in order; never goes upstream."""
+        quotes = (self.quote_cache.peek(symbol) for symbol in symbols)
+        return [quote for quote in quotes if quote is not None]
+
     def get_crypto_prices(self) -> List[Dict[str, Any]]:
         # Mock crypto data since CoinGecko requires premium for some features
         return [
@@ -54,18 +288,15 @@ class MarketDataService:
             {"symbol": "ETH", "name": "Ethereum", "price": 2800, "change_percent": 3.2},
             {"symbol": "BNB", "name": "Binance Coin", "price": 350, "change_percent": -1.2},
         ]
-    
-    def get_forex_rate(self, from_currency: str, to_currency: str) -> Dict[str, Any]:
+
+    async def get_forex_rate(self, from_currency: str, to_currency: str) -> Dict[str, Any]:
         try:
-            params = {
+            data = await self._query({
                 "function": "CURRENCY_EXCHANGE_RATE",
                 "from_currency": from_currency,
-                "to_currency": to_currency,
-                "apikey": self.alpha_vantage_key
-            }
-            response = requests.get(self.base_url, params=params, timeout=10)
-            data = response.json()
-            
+                "to_currency": to_currency
+            })
+
             if "Realtime Currency Exchange Rate" in data:
                 rate_data = data["Realtime Currency Exchange Rate"]
                 return {
@@ -76,5 +307,138 @@ class MarketDataService:
                 }
             return {"from": from_currency, "to": to_currency, "rate": 0}
         except Exception as e:
-            print(f"Error fetching forex rate: {e}")
+            self.logger.error(f"Error fetching forex rate: {e}")
             return {"from": from_currency, "to": to_currency, "rate": 0}
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            **self.quote_cache.stats(),
+            "refreshing": len(self._refreshing),
+            "coalesced_fetches": self._quote_flights.stats()
+        }
+
+    async def close(self):
+        """Cancel pending refreshes and close the pooled HTTP client"""
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await self.http_client.aclose()
+
+@dataclass(frozen=True)
+class MarketSnapshot:
+    """Immutable view of the market overview published by the refresher."""
+    stocks: Tuple[Dict[str, Any], ...]
+    crypto: Tuple[Dict[str, Any], ...]
+    last_updated: datetime
+
+    def to_response(self) -> Dict[str, Any]:
+        return {
+            "stocks": [dict(quote) for quote in self.stocks],
+            "crypto": [dict(price) for price in self.crypto],
+            "last_updated": self.last_updated.isoformat(),
+            "warming_up": False
+        }
+
+class MarketSnapshotRefresher:
+    """Background task that keeps a MarketSnapshot current.
+
+    Each cycle walks the overview symbols one call at a time, spaced so the
+    upstream calls-per-minute budget is never exceeded. The first snapshot is
+    published once the first pass has covered every symbol; after that it is
+    republished whenever a quote is refreshed or ages out. A failed fetch keeps
+    the last good quote for at most ``max_age`` seconds, and ``last_updated``
+    is the fetch time of the oldest quote served. Request handlers only ever
+    read ``snapshot``.
+    """
+
+    def __init__(self, service: MarketDataService, symbols: Optional[List[str]] = None):
+        self.service = service
+        self.symbols = list(symbols or OVERVIEW_SYMBOLS)
+        self.interval = float(os.environ.get('MARKET_REFRESH_INTERVAL', '300'))
+        self.calls_per_minute = float(os.environ.get('MARKET_CALLS_PER_MINUTE', '5'))
+        self.max_age = float(os.environ.get('MARKET_SNAPSHOT_MAX_AGE', str(3 * self.interval)))
+        self.logger = logging.getLogger("MarketSnapshotRefresher")
+        self.snapshot: Optional[MarketSnapshot] = None
+        # symbol -> (last good quote, when it was fetched)
+        self._quotes: Dict[str, Tuple[Dict[str, Any], datetime]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def current_stocks(self) -> List[Dict[str, Any]]:
+        """Stocks from the latest snapshot, or whatever the quote cache holds before the first one is published.
+
+        Requests never fetch the overview themselves: a burst of upstream calls
+        would break the refresher's call spacing and get its own calls throttled.
+        """
+        snapshot = self.snapshot
+        if snapshot is not None:
+            return [dict(quote) for quote in snapshot.stocks]
+        return self.service.cached_quotes(self.symbols)
+
+    def overview(self) -> Dict[str, Any]:
+        """The market overview response; ``warming_up`` is true until the first snapshot is published."""
+        snapshot = self.snapshot
+        if snapshot is not None:
+            return snapshot.to_response()
+        return {
+            "stocks": self.current_stocks(),
+            "crypto": self.service.get_crypto_prices(),
+            "last_updated": datetime.now(timezone.utc).isoformat(),
+            "warming_up": True
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                await self.refresh_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Market snapshot refresh failed: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (loop.time() - started)))
+
+    async def refresh_once(self):
+        spacing = 60.0 / self.calls_per_minute if self.calls_per_minute > 0 else 0.0
+        for i, symbol in enumerate(self.symbols):
+            if i and spacing:
+                await asyncio.sleep(spacing)
+            quote = await self.service.refresh_quote(symbol)
+            # A failed or throttled call comes back with price 0; keep the last good quote instead
+            changed = quote["price"] > 0
+            if changed:
+                self._quotes[symbol] = (quote, datetime.now(timezone.utc))
+            changed = self._drop_expired() or changed
+            # Until the first pass finishes, callers get the cached quotes flagged as warming up rather than a partial snapshot
+            if self.snapshot is not None and changed:
+                self._publish()
+        if self.snapshot is None:
+            self._publish()
+
+    def _drop_expired(self) -> bool:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.max_age)
+        expired = [symbol for symbol, (_, fetched_at) in self._quotes.items() if fetched_at < cutoff]
+        for symbol in expired:
+            self.logger.warning(f"Dropping {symbol} from the market snapshot: no good quote for {self.max_age:.0f}s")
+            del self._quotes[symbol]
+        return bool(expired)
+
+    def _publish(self):
+        kept = [self._quotes[symbol] for symbol in self.symbols if symbol in self._quotes]
+        self.snapshot = MarketSnapshot(
+            stocks=tuple(quote for quote, _ in kept),
+            crypto=tuple(self.service.get_crypto_prices()),
+            last_updated=min((fetched_at for _, fetched_at in kept), default=datetime.now(timezone.utc))
+        )
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+from typing import Dict, List
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from models import utc_datetime
+
+logger = logging.getLogger("migrations")
+
+# Timestamp fields that older code stored as ISO strings, by collection
+DATETIME_FIELDS: Dict[str, List[str]] = {
+    "users": ["created_at"],
+    "financial_profiles": ["updated_at"],
+    "user_progress": ["updated_at"],
+    "income_opportunities": ["created_at"],
+    "budget_analyses": ["created_at"],
+    "investment_advice": ["created_at"],
+    "opportunity_scans": ["created_at"],
+    "chat_messages": ["timestamp"],
+}
+
+async def migrate_datetimes(db, batch_size: int = 500, pause: float = 0.05) -> Dict[str, int]:
+    """Rewrite ISO-string timestamps as native BSON dates, one batch at a time.
+
+    Walks each collection in _id order so unparseable values are skipped
+    rather than matched again, and pauses between batches to keep the load
+    off request traffic. Idempotent; returns the documents converted per
+    collection.
+    """
+    converted: Dict[str, int] = {}
+    for collection, fields in DATETIME_FIELDS.items():
+        for field in fields:
+            count = 0
+            last_id = None
+            while True:
+                query = {field: {"$type": "string"}}
+                if last_id is not None:
+                    query["_id"] = {"$gt": last_id}
+                docs = await db[collection].find(query, {"_id": 1, field: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+                if not docs:
+                    break
+                last_id = docs[-1]["_id"]
+
+                updates = []
+                for doc in docs:
+                    try:
+                        updates.append(UpdateOne(
+                            {"_id": doc["_id"], field: doc[field]},
+                            {"$set": {field: utc_datetime(doc[field])}}
+                        ))
+                    except ValueError:
+                        logger.warning(f"Skipping unparseable {collection}.{field} on {doc['_id']}: {doc[field]!r}")
+                if updates:
+                    result = await db[collection].bulk_write(updates, ordered=False)
+                    count += result.modified_count
+                await asyncio.sleep(pause)
+            if count:
+                logger.info(f"Converted {count} {collection}.{field} values to native datetimes")
+            converted[f"{collection}.{field}"] = count
+    return converted
+
+async def run_datetime_migration(db, batch_size: int):
+    """Background entry point: log and swallow failures so startup never depends on the migration."""
+    try:
+        await migrate_datetimes(db, batch_size=batch_size)
+    except asyncio.CancelledError:
+        raise
+    except PyMongoError as e:
+        logger.error(f"Datetime migration stopped: {e}")
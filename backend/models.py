@@ -3,6 +3,26 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone
 import uuid
 
+def utc_datetime(value: Any) -> Any:
+    """Read a stored timestamp as an aware UTC datetime.
+
+    Documents written before the switch to native BSON dates hold ISO
+    strings; the driver hands back native dates as naive UTC unless the
+    client is tz-aware. Anything else is returned unchanged.
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def coerce_datetimes(doc: Dict[str, Any], *fields: str) -> Dict[str, Any]:
+    """Normalize the given timestamp fields of a stored document in place."""
+    for field in fields:
+        if doc.get(field) is not None:
+            doc[field] = utc_datetime(doc[field])
+    return doc
+
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
@@ -99,6 +119,13 @@ class OpportunityScan(BaseModel):
     personalized_alerts: List[str]
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class FinancialPlan(BaseModel):
+    budget: BudgetAnalysis
+    investment: InvestmentAdvice
+    income_opportunities: List[IncomeOpportunity]
+    opportunity_scan: OpportunityScan
+    fallback_sections: List[str] = []  # sections that timed out or failed and carry placeholder content
+
 class EducationLesson(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
@@ -133,9 +160,80 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     context: Optional[Dict[str, Any]] = None
+    stream: bool = False  # relay the reply as server-sent events
 
 class MarketData(BaseModel):
     symbol: str
     price: float
     change_percent: float
     volume: Optional[float] = None
+
+# ==================== LLM REPLY PAYLOADS ====================
+# The JSON each advisor method asks the model for; used as response schemas and to validate replies
+
+class SpendingLeakPayload(BaseModel):
+    category: str
+    amount: float
+    description: str
+
+class BudgetAnalysisPayload(BaseModel):
+    spending_leaks: List[SpendingLeakPayload]
+    recommendations: List[str]
+    potential_savings: float
+
+class InvestmentRecommendationPayload(BaseModel):
+    type: str
+    allocation: float
+    description: str
+    risk: str
+
+class PortfolioSuggestionPayload(BaseModel):
+    strategy: str
+    rebalance_frequency: str
+    expected_return: str
+
+class InvestmentAdvicePayload(BaseModel):
+    level: str
+    recommendations: List[InvestmentRecommendationPayload]
+    risk_assessment: str
+    portfolio_suggestion: PortfolioSuggestionPayload
+
+class IncomeOpportunityPayload(BaseModel):
+    title: str
+    description: str
+    category: str  # freelance, side-hustle, gig
+    estimated_income: str
+    effort_level: str  # low, medium, high
+    time_commitment: str
+    skills_required: List[str]
+
+class IncomeOpportunitiesPayload(BaseModel):
+    opportunities: List[IncomeOpportunityPayload]
+
+class ScanOpportunityPayload(BaseModel):
+    type: str  # Grant, Investment, Skill, Side-Hustle
+    title: str
+    description: str
+    risk_level: Optional[str] = None
+    deadline: Optional[str] = None
+
+class OpportunityScanPayload(BaseModel):
+    opportunities: List[ScanOpportunityPayload]
+    market_trends: List[str]
+    personalized_alerts: List[str]
+
+class LessonPayload(BaseModel):
+    title: str
+    category: str  # Basics, Budgeting, Investing, Advanced
+    content: str
+    duration_minutes: int
+    points: int
+
+class LessonsPayload(BaseModel):
+    lessons: List[LessonPayload]
+
+class FinancialPlanPayload(BaseModel):
+    budget: BudgetAnalysisPayload
+    investment: InvestmentAdvicePayload
+    income: IncomeOpportunitiesPayload
+    lessons: LessonsPayload
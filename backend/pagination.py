@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from models import utc_datetime
+
+# Timestamps are BSON dates, or ISO strings in documents that migrate_datetimes has not rewritten yet
+Timestamp = Union[datetime, str]
+
+def encode_cursor(timestamp: Timestamp, doc_id: str) -> str:
+    if isinstance(timestamp, str):
+        fields = {"t": timestamp, "s": 1, "id": doc_id}
+    else:
+        fields = {"t": timestamp.isoformat(), "id": doc_id}
+    payload = json.dumps(fields, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Timestamp, str]:
+    """Inverse of encode_cursor; raises ValueError for anything malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        timestamp = str(payload["t"]) if payload.get("s") else utc_datetime(payload["t"])
+        return timestamp, str(payload["id"])
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+async def fetch_page(collection, query: Dict[str, Any], time_field: str, limit: int,
+                     cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of documents, newest first, keyed on (time_field, id).
+
+    The cursor pins the last document of the previous page, so each page is
+    an index range scan from that point and costs the same however deep it
+    is. Returns the documents and the cursor for the next page, or None on
+    the last page.
+
+    Legacy ISO-string timestamps are paged too. MongoDB sorts every date
+    above every string, so a descending scan returns the dates first and
+    then the strings. Range operators only compare values of the same type,
+    so a date cursor also has to admit all string-typed documents.
+    """
+    if cursor:
+        timestamp, doc_id = decode_cursor(cursor)
+        after = [
+            {time_field: {"$lt": timestamp}},
+            {time_field: timestamp, "id": {"$lt": doc_id}},
+        ]
+        if not isinstance(timestamp, str):
+            after.append({time_field: {"$type": "string"}})
+        query = {**query, "$or": after}
+    docs = await collection.find(query, {"_id": 0}).sort([(time_field, -1), ("id", -1)]).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        position = last[time_field]
+        next_cursor = encode_cursor(position if isinstance(position, str) else utc_datetime(position), last["id"])
+    return docs, next_cursor
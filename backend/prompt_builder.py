@@ -0,0 +1,116 @@
+import logging
+import math
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("prompt_builder")
+
+# Rough average for English prose with Llama-family tokenizers; good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def _cell(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    if isinstance(value, (list, tuple)):
+        return ",".join(_cell(v) for v in value)
+    return str(value).replace("|", "/").replace("\n", " ")
+
+def compact_table(rows: List[Dict[str, Any]], columns: List[str]) -> str:
+    """Render dicts as a header line plus one pipe-separated line per row.
+
+    Far denser than the repr of a list of dicts: keys appear once and
+    numbers are trimmed to two decimals.
+    """
+    lines = ["|".join(columns)]
+    for row in rows:
+        lines.append("|".join(_cell(row.get(column, "")) for column in columns))
+    return "\n".join(lines)
+
+class PromptMetrics:
+    """Per-method prompt size totals, kept for the health endpoint."""
+
+    def __init__(self):
+        self._methods: Dict[str, Dict[str, int]] = {}
+
+    def record(self, method: str, tokens: int, trimmed_tokens: int):
+        stats = self._methods.setdefault(method, {"calls": 0, "total_tokens": 0, "max_tokens": 0, "trimmed_calls": 0})
+        stats["calls"] += 1
+        stats["total_tokens"] += tokens
+        stats["max_tokens"] = max(stats["max_tokens"], tokens)
+        if trimmed_tokens:
+            stats["trimmed_calls"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            method: {**stats, "avg_tokens": round(stats["total_tokens"] / stats["calls"], 1)}
+            for method, stats in self._methods.items()
+        }
+
+prompt_metrics = PromptMetrics()
+
+class _Section:
+    __slots__ = ("text", "priority", "keep_tail")
+
+    def __init__(self, text: str, priority: Optional[int], keep_tail: bool = False):
+        self.text = text
+        self.priority = priority
+        self.keep_tail = keep_tail
+
+class PromptBuilder:
+    """Assembles a prompt from sections and enforces an input token budget.
+
+    ``add`` sections are always kept verbatim. ``add_optional`` sections hold
+    data that can be shortened: when the prompt runs over budget they are
+    cut back, lowest priority first, at line boundaries where there are any,
+    from the end (or from the start with ``keep_tail``, for history where the
+    newest lines matter most). Sections are concatenated as given, so callers
+    own the newlines between them.
+    """
+
+    def __init__(self, method: str, budget_tokens: int):
+        self.method = method
+        self.budget_tokens = budget_tokens
+        self._sections: List[_Section] = []
+
+    def add(self, text: str) -> "PromptBuilder":
+        self._sections.append(_Section(text, None))
+        return self
+
+    def add_optional(self, text: str, priority: int = 0, keep_tail: bool = False) -> "PromptBuilder":
+        self._sections.append(_Section(text, priority, keep_tail))
+        return self
+
+    def build(self) -> str:
+        original = estimate_tokens("".join(section.text for section in self._sections))
+        over = original - self.budget_tokens
+        trimmable = sorted((s for s in self._sections if s.priority is not None), key=lambda s: s.priority)
+        for section in trimmable:
+            if over <= 0:
+                break
+            before = estimate_tokens(section.text)
+            section.text = self._shorten(section.text, len(section.text) - over * CHARS_PER_TOKEN, section.keep_tail)
+            over -= before - estimate_tokens(section.text)
+
+        prompt = "".join(section.text for section in self._sections)
+        tokens = estimate_tokens(prompt)
+        trimmed = max(0, original - tokens)
+        prompt_metrics.record(self.method, tokens, trimmed)
+        logger.info(f"Prompt {self.method}: ~{tokens} tokens (budget {self.budget_tokens}, trimmed {trimmed})")
+        if tokens > self.budget_tokens:
+            logger.warning(f"Prompt {self.method} exceeds its budget with only required sections left")
+        return prompt
+
+    @staticmethod
+    def _shorten(text: str, keep_chars: int, keep_tail: bool) -> str:
+        if keep_chars <= 0:
+            return ""
+        body = text.rstrip("\n")
+        ending = text[len(body):]
+        if keep_tail:
+            start = len(body) - keep_chars
+            cut = body.find("\n", start)
+            return (body[cut + 1:] if cut != -1 else body[start:]) + ending
+        cut = body.rfind("\n", 0, keep_chars)
+        return (body[:cut] if cut != -1 else body[:keep_chars]) + ending
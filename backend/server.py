@@ -1,35 +1,86 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
+import json
+import asyncio
 import logging
 from pathlib import Path
-from typing import List, Dict, Any
-from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 
 from models import (
     User, UserCreate, UserLogin, UserResponse,
     FinancialProfile, FinancialProfileUpdate,
     IncomeOpportunity, BudgetAnalysis, InvestmentAdvice,
-    OpportunityScan, EducationLesson, UserProgress,
-    ChatMessage, ChatRequest
+    OpportunityScan, FinancialPlan, EducationLesson, UserProgress,
+    ChatMessage, ChatRequest, coerce_datetimes
 )
-from auth_utils import hash_password, verify_password, create_access_token, verify_token
-from ai_service import AIFinancialAdvisor
-from market_service import MarketDataService
+from auth_utils import (
+    hash_password_async, verify_password_async, create_access_token, verify_token,
+    verify_token_claims, revoke_token, TokenClaims, password_hasher, token_cache
+)
+from ai_service import AIFinancialAdvisor, ChatStreamInterrupted
+from market_service import MarketDataService, MarketSnapshotRefresher
+from db_indexes import ensure_indexes, describe_indexes
+from user_data import ProfileCache, UserDataLoader
+from write_behind import WriteBehindQueue
+from migrations import run_datetime_migration
+from pagination import fetch_page
+from chat_memory import ConversationMemory
+from prompt_builder import prompt_metrics
+from metrics import REGISTRY, MetricsMiddleware, MongoCommandMetrics
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# tz_aware so native BSON dates come back as aware UTC datetimes; the listener times every command
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=[MongoCommandMetrics()])
 db = client[os.environ['DB_NAME']]
 
 # Initialize services
 ai_advisor = AIFinancialAdvisor()
 market_service = MarketDataService()
+market_refresher = MarketSnapshotRefresher(market_service)
+write_behind = WriteBehindQueue(
+    db,
+    enabled=os.environ.get('WRITE_BEHIND_ENABLED', 'true').lower() == 'true',
+    max_size=int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', '1000')),
+    max_retries=int(os.environ.get('WRITE_BEHIND_MAX_RETRIES', '5')),
+    retry_delay=float(os.environ.get('WRITE_BEHIND_RETRY_DELAY', '0.5'))
+)
+conversation_memory = ConversationMemory(
+    db, ai_advisor,
+    max_chars=int(os.environ.get('CHAT_SUMMARY_MAX_CHARS', '1200'))
+)
+profile_cache = ProfileCache(
+    ttl_seconds=float(os.environ.get('PROFILE_CACHE_TTL', '5')),
+    max_entries=int(os.environ.get('PROFILE_CACHE_MAX_ENTRIES', '10000'))
+)
+
+# Share generated advice across workers and restarts unless disabled
+if os.environ.get('AI_CACHE_PERSIST', 'true').lower() == 'true':
+    ai_advisor.response_cache.attach_store(db.ai_response_cache)
+
+# Logouts are shared by every worker and survive restarts
+token_cache.attach_store(db.revoked_tokens)
+
+# Generated lesson sets are shared by every user with the same level and profile fingerprint
+LESSON_SET_TTL = timedelta(hours=float(os.environ.get('LESSONS_TTL_HOURS', '24')))
+FALLBACK_LESSON_SET_TTL = timedelta(minutes=5)
+
+# Upper bound for ?limit= on paginated list endpoints
+MAX_PAGE_SIZE = 100
+
+# Per-section deadline for /plan; a section that misses it is replaced by its fallback
+PLAN_SECTION_TIMEOUT = float(os.environ.get('PLAN_SECTION_TIMEOUT', '20'))
 
 # Create the main app
 app = FastAPI(title="Financial Empowerment AI")
@@ -42,6 +93,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def get_user_data(user_id: str = Depends(verify_token)) -> UserDataLoader:
+    """Request-scoped loader; FastAPI reuses one instance across the request's dependency graph."""
+    return UserDataLoader(db, profile_cache, user_id)
+
 # ==================== AUTH ROUTES ====================
 
 @api_router.post("/auth/register", response_model=Dict[str, Any])
@@ -54,10 +109,14 @@ async def register(user_data: UserCreate):
     # Create user and related records
     user = User(
         email=user_data.email,
-        password_hash=hash_password(user_data.password),
+        password_hash=await hash_password_async(user_data.password),
         full_name=user_data.full_name
     )
-    await db.users.insert_one(user.model_dump())
+    try:
+        await db.users.insert_one(user.model_dump())
+    except DuplicateKeyError:
+        # Lost a race with a concurrent registration for the same email
+        raise HTTPException(status_code=400, detail="Email already registered")
     await db.financial_profiles.insert_one(FinancialProfile(user_id=user.id).model_dump())
     await db.user_progress.insert_one(UserProgress(user_id=user.id).model_dump())
 
@@ -76,7 +135,7 @@ async def register(user_data: UserCreate):
 @api_router.post("/auth/login", response_model=Dict[str, Any])
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user['password_hash']):
+    if not user or not await verify_password_async(credentials.password, user['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_access_token({"user_id": user['id']})
@@ -90,65 +149,62 @@ async def login(credentials: UserLogin):
         }
     }
 
+@api_router.post("/auth/logout")
+async def logout(authorization: str = Header(None), claims: TokenClaims = Depends(verify_token_claims)):
+    await revoke_token(authorization, claims)
+    return {"status": "logged_out"}
+
 @api_router.get("/auth/me", response_model=UserResponse)
 async def get_current_user(user_id: str = Depends(verify_token)):
     user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if isinstance(user['created_at'], str):
-        user['created_at'] = datetime.fromisoformat(user['created_at'])
+    coerce_datetimes(user, 'created_at')
     
     return UserResponse(**user)
 
 # ==================== PROFILE ROUTES ====================
 
 @api_router.get("/profile", response_model=FinancialProfile)
-async def get_profile(user_id: str = Depends(verify_token)):
-    profile = await db.financial_profiles.find_one({"user_id": user_id}, {"_id": 0})
+async def get_profile(user_data: UserDataLoader = Depends(get_user_data)):
+    profile = await user_data.profile()
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
-    if isinstance(profile['updated_at'], str):
-        profile['updated_at'] = datetime.fromisoformat(profile['updated_at'])
+    coerce_datetimes(profile, 'updated_at')
     
     return FinancialProfile(**profile)
 
 @api_router.put("/profile", response_model=FinancialProfile)
 async def update_profile(profile_data: FinancialProfileUpdate, user_id: str = Depends(verify_token)):
     update_data = {k: v for k, v in profile_data.model_dump().items() if v is not None}
-    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    update_data['updated_at'] = datetime.now(timezone.utc)
     
     await db.financial_profiles.update_one(
         {"user_id": user_id},
         {"$set": update_data}
     )
+    profile_cache.invalidate(user_id, "profile")
     
     profile = await db.financial_profiles.find_one({"user_id": user_id}, {"_id": 0})
-    if isinstance(profile['updated_at'], str):
-        profile['updated_at'] = datetime.fromisoformat(profile['updated_at'])
+    coerce_datetimes(profile, 'updated_at')
     
     return FinancialProfile(**profile)
 
 # ==================== INCOME GENERATION ROUTES ====================
 
-@api_router.post("/income-generation", response_model=List[IncomeOpportunity])
-async def generate_income_opportunities(user_id: str = Depends(verify_token)):
-    profile = await db.financial_profiles.find_one({"user_id": user_id}, {"_id": 0})
-    if not profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
-    
-    opportunities_data = await ai_advisor.generate_income_opportunities(
+def generate_income_data(profile: Dict[str, Any]):
+    return ai_advisor.generate_income_opportunities(
         skills=profile.get('skills', []),
         location=profile.get('location', ''),
         time_availability=profile.get('time_availability', ''),
         financial_level=profile.get('financial_level', 'beginner')
     )
-    
-    # Save opportunities
-    opportunities = []
-    for opp_data in opportunities_data:
-        opp = IncomeOpportunity(
+
+def build_income_opportunities(user_id: str, opportunities_data: List[Dict[str, Any]]) -> List[IncomeOpportunity]:
+    return [
+        IncomeOpportunity(
             user_id=user_id,
             title=opp_data['title'],
             description=opp_data['description'],
@@ -158,47 +214,73 @@ async def generate_income_opportunities(user_id: str = Depends(verify_token)):
             time_commitment=opp_data['time_commitment'],
             skills_required=opp_data['skills_required']
         )
-        opp_dict = opp.model_dump()
-        opp_dict['created_at'] = opp_dict['created_at'].isoformat()
-        await db.income_opportunities.insert_one(opp_dict)
-        opportunities.append(opp)
+        for opp_data in opportunities_data
+    ]
+
+@api_router.post("/income-generation", response_model=List[IncomeOpportunity])
+async def generate_income_opportunities(user_id: str = Depends(verify_token), user_data: UserDataLoader = Depends(get_user_data)):
+    profile = await user_data.profile()
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    opportunities_data, _ = await generate_income_data(profile)
+    
+    # Save opportunities
+    opportunities = build_income_opportunities(user_id, opportunities_data)
+    
+    await write_behind.submit("income_opportunities", [opp.model_dump() for opp in opportunities])
     
     return opportunities
 
 @api_router.get("/income-generation", response_model=List[IncomeOpportunity])
-async def get_income_opportunities(user_id: str = Depends(verify_token)):
-    opportunities = await db.income_opportunities.find({"user_id": user_id}, {"_id": 0}).sort("created_at", -1).limit(10).to_list(10)
+async def get_income_opportunities(
+    response: Response,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user_id: str = Depends(verify_token)
+):
+    try:
+        opportunities, next_cursor = await fetch_page(
+            db.income_opportunities, {"user_id": user_id}, "created_at", limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     for opp in opportunities:
-        if isinstance(opp['created_at'], str):
-            opp['created_at'] = datetime.fromisoformat(opp['created_at'])
+        coerce_datetimes(opp, 'created_at')
     
     return [IncomeOpportunity(**opp) for opp in opportunities]
 
 # ==================== BUDGET ANALYSIS ROUTES ====================
 
-@api_router.post("/budget/analyze", response_model=BudgetAnalysis)
-async def analyze_budget(user_id: str = Depends(verify_token)):
-    profile = await db.financial_profiles.find_one({"user_id": user_id}, {"_id": 0})
-    if not profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
-    
-    analysis_data = await ai_advisor.analyze_budget(
+def generate_budget_data(profile: Dict[str, Any]):
+    return ai_advisor.analyze_budget(
         monthly_income=profile.get('monthly_income', 0),
         monthly_expenses=profile.get('monthly_expenses', 0),
         spending_patterns={}
     )
-    
-    analysis = BudgetAnalysis(
+
+def build_budget_analysis(user_id: str, analysis_data: Dict[str, Any]) -> BudgetAnalysis:
+    return BudgetAnalysis(
         user_id=user_id,
         spending_leaks=analysis_data['spending_leaks'],
         recommendations=analysis_data['recommendations'],
         potential_savings=analysis_data['potential_savings']
     )
+
+@api_router.post("/budget/analyze", response_model=BudgetAnalysis)
+async def analyze_budget(user_id: str = Depends(verify_token), user_data: UserDataLoader = Depends(get_user_data)):
+    profile = await user_data.profile()
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    analysis_data, _ = await generate_budget_data(profile)
+    
+    analysis = build_budget_analysis(user_id, analysis_data)
     
-    analysis_dict = analysis.model_dump()
-    analysis_dict['created_at'] = analysis_dict['created_at'].isoformat()
-    await db.budget_analyses.insert_one(analysis_dict)
+    await write_behind.submit("budget_analyses", [analysis.model_dump()])
     
     return analysis
 
@@ -208,38 +290,41 @@ async def get_latest_budget_analysis(user_id: str = Depends(verify_token)):
     if not analysis:
         raise HTTPException(status_code=404, detail="No budget analysis found")
     
-    if isinstance(analysis['created_at'], str):
-        analysis['created_at'] = datetime.fromisoformat(analysis['created_at'])
+    coerce_datetimes(analysis, 'created_at')
     
     return BudgetAnalysis(**analysis)
 
 # ==================== INVESTMENT ADVICE ROUTES ====================
 
-@api_router.post("/investment/advice", response_model=InvestmentAdvice)
-async def get_investment_advice(user_id: str = Depends(verify_token)):
-    profile = await db.financial_profiles.find_one({"user_id": user_id}, {"_id": 0})
-    if not profile:
-        raise HTTPException(status_code=404, detail="Profile not found")
-    
+def generate_investment_data(profile: Dict[str, Any]):
     monthly_savings = profile.get('monthly_income', 0) - profile.get('monthly_expenses', 0)
     
-    advice_data = await ai_advisor.provide_investment_advice(
+    return ai_advisor.provide_investment_advice(
         financial_level=profile.get('financial_level', 'beginner'),
         risk_tolerance=profile.get('risk_tolerance', 'moderate'),
         monthly_savings=max(0, monthly_savings)
     )
-    
-    advice = InvestmentAdvice(
+
+def build_investment_advice(user_id: str, advice_data: Dict[str, Any]) -> InvestmentAdvice:
+    return InvestmentAdvice(
         user_id=user_id,
         level=advice_data['level'],
         recommendations=advice_data['recommendations'],
         risk_assessment=advice_data['risk_assessment'],
         portfolio_suggestion=advice_data['portfolio_suggestion']
     )
+
+@api_router.post("/investment/advice", response_model=InvestmentAdvice)
+async def get_investment_advice(user_id: str = Depends(verify_token), user_data: UserDataLoader = Depends(get_user_data)):
+    profile = await user_data.profile()
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    advice_data, _ = await generate_investment_data(profile)
     
-    advice_dict = advice.model_dump()
-    advice_dict['created_at'] = advice_dict['created_at'].isoformat()
-    await db.investment_advice.insert_one(advice_dict)
+    advice = build_investment_advice(user_id, advice_data)
+    
+    await write_behind.submit("investment_advice", [advice.model_dump()])
     
     return advice
 
@@ -249,33 +334,36 @@ async def get_latest_investment_advice(user_id: str = Depends(verify_token)):
     if not advice:
         raise HTTPException(status_code=404, detail="No investment advice found")
     
-    if isinstance(advice['created_at'], str):
-        advice['created_at'] = datetime.fromisoformat(advice['created_at'])
+    coerce_datetimes(advice, 'created_at')
     
     return InvestmentAdvice(**advice)
 
 # ==================== OPPORTUNITY SCANNER ROUTES ====================
 
-@api_router.post("/opportunities/scan", response_model=OpportunityScan)
-async def scan_opportunities(user_id: str = Depends(verify_token)):
-    profile = await db.financial_profiles.find_one({"user_id": user_id}, {"_id": 0})
-    market_data = market_service.get_market_overview()
+async def generate_scan_data(profile: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+    market_data = market_refresher.current_stocks()
     
-    scan_data = await ai_advisor.scan_opportunities(
+    return await ai_advisor.scan_opportunities(
         user_profile=profile,
         market_data={"stocks": market_data}
     )
-    
-    scan = OpportunityScan(
+
+def build_opportunity_scan(user_id: str, scan_data: Dict[str, Any]) -> OpportunityScan:
+    return OpportunityScan(
         user_id=user_id,
         opportunities=scan_data['opportunities'],
         market_trends=scan_data['market_trends'],
         personalized_alerts=scan_data['personalized_alerts']
     )
+
+@api_router.post("/opportunities/scan", response_model=OpportunityScan)
+async def scan_opportunities(user_id: str = Depends(verify_token), user_data: UserDataLoader = Depends(get_user_data)):
+    profile = await user_data.profile()
+    scan_data, _ = await generate_scan_data(profile)
     
-    scan_dict = scan.model_dump()
-    scan_dict['created_at'] = scan_dict['created_at'].isoformat()
-    await db.opportunity_scans.insert_one(scan_dict)
+    scan = build_opportunity_scan(user_id, scan_data)
+    
+    await write_behind.submit("opportunity_scans", [scan.model_dump()])
     
     return scan
 
@@ -285,51 +373,137 @@ async def get_latest_opportunity_scan(user_id: str = Depends(verify_token)):
     if not scan:
         raise HTTPException(status_code=404, detail="No opportunity scan found")
     
-    if isinstance(scan['created_at'], str):
-        scan['created_at'] = datetime.fromisoformat(scan['created_at'])
+    coerce_datetimes(scan, 'created_at')
     
     return OpportunityScan(**scan)
 
+# ==================== FINANCIAL PLAN ROUTES ====================
+
+async def plan_section(section: str, pending) -> Tuple[Any, bool]:
+    """Await one plan section under PLAN_SECTION_TIMEOUT; returns (result, used_fallback).
+    
+    ``pending`` resolves to the generator's own (result, used_fallback) pair,
+    so canned data served after a swallowed LLM error is flagged too.
+    """
+    try:
+        return await asyncio.wait_for(pending, timeout=PLAN_SECTION_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Plan section {section} timed out after {PLAN_SECTION_TIMEOUT}s; using fallback")
+    except Exception:
+        logger.exception(f"Plan section {section} failed; using fallback")
+    # No reply was parsed for this section, so the fallback counts against the plan, not the section's method
+    ai_advisor.record_fallback("plan")
+    return ai_advisor.fallback(section), True
+
+@api_router.post("/plan", response_model=FinancialPlan)
+async def generate_plan_fanout(user_id: str = Depends(verify_token), user_data: UserDataLoader = Depends(get_user_data)):
+    """Budget, investment, income and opportunity sections in one call, generated concurrently.
+    
+    One LLM call per section; AIFinancialAdvisor.generate_financial_plan is the single-prompt alternative.
+    """
+    profile = await user_data.profile()
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    # Each section gets its own deadline, so the response waits at most for the slowest one
+    (budget_data, budget_failed), (advice_data, advice_failed), (income_data, income_failed), (scan_data, scan_failed) = await asyncio.gather(
+        plan_section("budget", generate_budget_data(profile)),
+        plan_section("investment", generate_investment_data(profile)),
+        plan_section("income", generate_income_data(profile)),
+        plan_section("opportunities", generate_scan_data(profile))
+    )
+    
+    plan = FinancialPlan(
+        budget=build_budget_analysis(user_id, budget_data),
+        investment=build_investment_advice(user_id, advice_data),
+        income_opportunities=build_income_opportunities(user_id, income_data),
+        opportunity_scan=build_opportunity_scan(user_id, scan_data),
+        fallback_sections=[
+            section for section, failed in [
+                ("budget", budget_failed), ("investment", advice_failed),
+                ("income", income_failed), ("opportunities", scan_failed)
+            ] if failed
+        ]
+    )
+    
+    await asyncio.gather(
+        write_behind.submit("budget_analyses", [plan.budget.model_dump()]),
+        write_behind.submit("investment_advice", [plan.investment.model_dump()]),
+        write_behind.submit("income_opportunities", [opp.model_dump() for opp in plan.income_opportunities]),
+        write_behind.submit("opportunity_scans", [plan.opportunity_scan.model_dump()])
+    )
+    
+    return plan
+
 # ==================== EDUCATION ROUTES ====================
 
 @api_router.get("/education/lessons", response_model=List[EducationLesson])
-async def get_lessons(level: str = "beginner", user_id: str = Depends(verify_token)):
+async def get_lessons(level: str = "beginner", user_id: str = Depends(verify_token), user_data: UserDataLoader = Depends(get_user_data)):
     """Get personalized education lessons based on user profile and level"""
-    profile = await db.financial_profiles.find_one({"user_id": user_id}, {"_id": 0})
+    profile = await user_data.profile()
+    fingerprint = ai_advisor.lesson_fingerprint(level, profile or {})
+    now = datetime.now(timezone.utc)
+    
+    # Serve the stored set while it's fresh; the fingerprint changes when the profile changes materially
+    lesson_set = await db.lessons.find_one(
+        {"level": level, "fingerprint": fingerprint, "expires_at": {"$gt": now}},
+        {"_id": 0, "lessons": 1}
+    )
+    if lesson_set:
+        return [EducationLesson(**lesson) for lesson in lesson_set['lessons']]
     
     # Generate personalized lessons using AI
-    lessons_data = await ai_advisor.generate_personalized_lessons(level, profile or {})
+    lessons_data, outcome = await ai_advisor.generate_personalized_lessons(level, profile or {})
+    lessons = [EducationLesson(**lesson) for lesson in lessons_data]
+    
+    # Static fallbacks and sets salvaged from truncated replies are kept only briefly so the LLM gets retried soon
+    ttl = LESSON_SET_TTL if outcome in ("validated", "complete") else FALLBACK_LESSON_SET_TTL
+    await db.lessons.update_one(
+        {"level": level, "fingerprint": fingerprint},
+        {"$set": {
+            "level": level,
+            "fingerprint": fingerprint,
+            "lessons": [lesson.model_dump() for lesson in lessons],
+            "created_at": now,
+            "expires_at": now + ttl
+        }},
+        upsert=True
+    )
     
-    return [EducationLesson(**lesson) for lesson in lessons_data]
+    return lessons
 
 @api_router.post("/education/complete/{lesson_id}", response_model=UserProgress)
 async def complete_lesson(lesson_id: str, user_id: str = Depends(verify_token)):
-    progress = await db.user_progress.find_one({"user_id": user_id}, {"_id": 0})
-    
-    if lesson_id not in progress.get('completed_lessons', []):
-        await db.user_progress.update_one(
-            {"user_id": user_id},
-            {
-                "$push": {"completed_lessons": lesson_id},
-                "$inc": {"total_points": 100, "current_streak": 1},
-                "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
-            }
-        )
+    # One atomic update decides whether the lesson is new, so concurrent or repeated calls award points once
+    progress = await db.user_progress.find_one_and_update(
+        {"user_id": user_id, "completed_lessons": {"$ne": lesson_id}},
+        {
+            "$push": {"completed_lessons": lesson_id},
+            "$inc": {"total_points": 100, "current_streak": 1},
+            "$set": {"updated_at": datetime.now(timezone.utc)}
+        },
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if progress is not None:
+        profile_cache.invalidate(user_id, "progress")
+    else:
+        # Already completed, or the user has no progress document
+        progress = await db.user_progress.find_one({"user_id": user_id}, {"_id": 0})
+        if not progress:
+            raise HTTPException(status_code=404, detail="Progress not found")
     
-    progress = await db.user_progress.find_one({"user_id": user_id}, {"_id": 0})
-    if isinstance(progress['updated_at'], str):
-        progress['updated_at'] = datetime.fromisoformat(progress['updated_at'])
+    coerce_datetimes(progress, 'updated_at')
     
     return UserProgress(**progress)
 
 @api_router.get("/education/progress", response_model=UserProgress)
-async def get_progress(user_id: str = Depends(verify_token)):
-    progress = await db.user_progress.find_one({"user_id": user_id}, {"_id": 0})
+async def get_progress(user_data: UserDataLoader = Depends(get_user_data)):
+    progress = await user_data.progress()
     if not progress:
         raise HTTPException(status_code=404, detail="Progress not found")
     
-    if isinstance(progress['updated_at'], str):
-        progress['updated_at'] = datetime.fromisoformat(progress['updated_at'])
+    coerce_datetimes(progress, 'updated_at')
     
     return UserProgress(**progress)
 
@@ -337,87 +511,181 @@ async def get_progress(user_id: str = Depends(verify_token)):
 
 @api_router.post("/ai-chat", response_model=Dict[str, str])
 @api_router.post("/ai/chat", response_model=Dict[str, str])
-async def chat_with_ai(chat_request: ChatRequest, user_id: str = Depends(verify_token)):
-    profile = await db.financial_profiles.find_one({"user_id": user_id}, {"_id": 0})
+async def chat_with_ai(chat_request: ChatRequest, user_id: str = Depends(verify_token), user_data: UserDataLoader = Depends(get_user_data)):
+    profile = await user_data.profile()
+    
+    # The rolling summary carries older turns; the ones it hasn't folded in yet are sent verbatim
+    summary, history = await conversation_memory.get_context(user_id, recent_limit=4)
     
-    # Get recent chat history
-    history = await db.chat_messages.find({"user_id": user_id}, {"_id": 0}).sort("timestamp", -1).limit(10).to_list(10)
+    if chat_request.stream:
+        return stream_chat_response(user_id, chat_request.message, profile, history, summary)
     
     response = await ai_advisor.chat_with_advisor(
         user_message=chat_request.message,
         user_profile=profile,
-        chat_history=history
+        chat_history=history,
+        conversation_summary=summary
     )
     if not response:
         logger.warning("AI response empty; returning fallback text")
     
-    # Save messages
-    user_msg = ChatMessage(user_id=user_id, role="user", content=chat_request.message)
-    assistant_msg = ChatMessage(user_id=user_id, role="assistant", content=response)
-    
-    user_msg_dict = user_msg.model_dump()
-    user_msg_dict['timestamp'] = user_msg_dict['timestamp'].isoformat()
-    assistant_msg_dict = assistant_msg.model_dump()
-    assistant_msg_dict['timestamp'] = assistant_msg_dict['timestamp'].isoformat()
-    
-    await db.chat_messages.insert_many([user_msg_dict, assistant_msg_dict])
+    await save_chat_turn(user_id, chat_request.message, response)
     
     return {"response": response}
 
+def stream_chat_response(user_id: str, message: str, profile: Dict[str, Any], history: List[Dict[str, Any]],
+                         summary: Optional[str]) -> StreamingResponse:
+    """Relay the advisor reply as server-sent events and persist the turn once the stream ends.
+    
+    An upstream failure mid-reply ends the stream with an ``error`` event
+    instead of ``done``. Only a reply whose ``done`` event went out is
+    saved, so neither that nor a client disconnect leaves a truncated
+    reply in history or in the summary.
+    """
+    parts: List[str] = []
+    completed = False
+    
+    async def relay():
+        nonlocal completed
+        try:
+            async for delta in ai_advisor.stream_chat_with_advisor(
+                user_message=message,
+                user_profile=profile,
+                chat_history=history,
+                conversation_summary=summary
+            ):
+                parts.append(delta)
+                yield f"data: {json.dumps({'delta': delta})}\n\n"
+        except ChatStreamInterrupted:
+            yield f"data: {json.dumps({'error': 'The advisor reply was interrupted, please try again'})}\n\n"
+            return
+        yield f"data: {json.dumps({'done': True})}\n\n"
+        completed = True
+    
+    async def persist():
+        if not completed:
+            logger.warning(f"Chat stream for {user_id} did not complete; reply not saved")
+            return
+        await save_chat_turn(user_id, message, "".join(parts))
+    
+    return StreamingResponse(
+        relay(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(persist)
+    )
+
+async def save_chat_turn(user_id: str, message: str, response: str):
+    user_msg = ChatMessage(user_id=user_id, role="user", content=message)
+    # BSON dates keep milliseconds only; keep the reply strictly after the question so history sorts stably
+    assistant_msg = ChatMessage(
+        user_id=user_id, role="assistant", content=response,
+        timestamp=user_msg.timestamp + timedelta(milliseconds=1)
+    )
+    
+    await db.chat_messages.insert_many([user_msg.model_dump(), assistant_msg.model_dump()])
+    conversation_memory.schedule_update(user_id, message, response, covers_until=assistant_msg.timestamp)
+
 @api_router.get("/ai-chat/history", response_model=List[ChatMessage])
 @api_router.get("/ai/chat/history", response_model=List[ChatMessage])
-async def get_chat_history(user_id: str = Depends(verify_token)):
-    messages = await db.chat_messages.find({"user_id": user_id}, {"_id": 0}).sort("timestamp", -1).limit(50).to_list(50)
+async def get_chat_history(
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user_id: str = Depends(verify_token)
+):
+    """Newest page of chat history in chronological order; pass X-Next-Cursor back as ?cursor= for older messages."""
+    try:
+        messages, next_cursor = await fetch_page(
+            db.chat_messages, {"user_id": user_id}, "timestamp", limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     
     for msg in messages:
-        if isinstance(msg['timestamp'], str):
-            msg['timestamp'] = datetime.fromisoformat(msg['timestamp'])
+        coerce_datetimes(msg, 'timestamp')
     
     return [ChatMessage(**msg) for msg in reversed(messages)]
 
 # ==================== HEALTH ROUTES ====================
 
 @api_router.get("/health/llm")
-async def llm_health_check():
+async def llm_health_check(deep: bool = False):
+    """Cached LLM status from recent traffic and background probes; ``deep=true`` runs a live probe first."""
     try:
         has_key = bool(os.environ.get('GROQ_API_KEY'))
         client_inited = ai_advisor.client is not None
-        test = await ai_advisor._call_llm("Reply with OK.")
-        ok = test.strip().upper().startswith("OK") or len(test.strip()) > 0
+        if deep:
+            await ai_advisor.health.probe()
         return {
-            "status": "up" if ok else "degraded",
-            "sample": test[:160],
+            **ai_advisor.health.status(),
             "groq_key_present": has_key,
             "client_initialized": client_inited,
-            "last_error": getattr(ai_advisor, 'last_error', None)
+            "last_error": getattr(ai_advisor, 'last_error', None),
+            "response_cache": ai_advisor.response_cache.stats(),
+            "coalesced_calls": ai_advisor._llm_flights.stats(),
+            "prompt_budget_tokens": ai_advisor.prompt_budget_tokens,
+            "prompt_tokens": prompt_metrics.snapshot(),
+            "token_usage": ai_advisor.usage.snapshot(),
+            "response_format": ai_advisor.response_format,
+            "response_format_rejections": ai_advisor.response_format_rejections,
+            "json_parsing": ai_advisor.json_stats.snapshot(),
+            "gateway": ai_advisor.gateway.state()
         }
     except Exception as e:
         logger.exception("LLM health check failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/health/auth")
+async def auth_health_check():
+    return {
+        "password_hasher": password_hasher.stats(),
+        "token_cache": token_cache.stats(),
+        "profile_cache": profile_cache.stats()
+    }
+
+@api_router.get("/health/db")
+async def db_health_check():
+    return {"indexes": await describe_indexes(db)}
+
+@api_router.get("/health/writes")
+async def write_behind_health_check():
+    return {"write_behind": write_behind.stats()}
+
+@api_router.get("/health/market")
+async def market_health_check():
+    return {
+        "alpha_vantage_key_present": bool(market_service.alpha_vantage_key),
+        "quote_cache": market_service.cache_stats()
+    }
+
 # ==================== MARKET DATA ROUTES ====================
 
 @api_router.get("/market/overview")
 async def get_market_overview():
-    stocks = market_service.get_market_overview()
-    crypto = market_service.get_crypto_prices()
+    return market_refresher.overview()
+
+@api_router.get("/market/quotes")
+async def get_stock_quotes(symbols: str):
+    """Batch quotes for a comma-separated symbol list, e.g. ?symbols=AAPL,MSFT"""
+    try:
+        quotes = await market_service.get_quotes(symbols.split(','))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return {
-        "stocks": stocks,
-        "crypto": crypto,
-        "last_updated": datetime.now(timezone.utc).isoformat()
-    }
+    return {"quotes": quotes}
 
 @api_router.get("/market/stock/{symbol}")
 async def get_stock_data(symbol: str):
-    return market_service.get_stock_quote(symbol)
+    return await market_service.get_stock_quote(symbol)
 
 # ==================== DASHBOARD STATS ====================
 
 @api_router.get("/dashboard/stats")
-async def get_dashboard_stats(user_id: str = Depends(verify_token)):
-    profile = await db.financial_profiles.find_one({"user_id": user_id}, {"_id": 0})
-    progress = await db.user_progress.find_one({"user_id": user_id}, {"_id": 0})
+async def get_dashboard_stats(user_data: UserDataLoader = Depends(get_user_data)):
+    profile, progress = await user_data.load()
     
     monthly_savings = profile.get('monthly_income', 0) - profile.get('monthly_expenses', 0)
     savings_rate = (monthly_savings / profile.get('monthly_income', 1)) * 100 if profile.get('monthly_income', 0) > 0 else 0
@@ -436,6 +704,36 @@ async def get_dashboard_stats(user_id: str = Depends(verify_token)):
 
 # (duplicate health route removed above)
 
+# ==================== METRICS ====================
+
+def collect_cache_metrics():
+    ai_cache = ai_advisor.response_cache.stats()
+    quotes = market_service.quote_cache.stats()
+    profiles = profile_cache.stats()
+    tokens = token_cache.stats()
+    yield (
+        "cache_requests_total", "counter", "Cache lookups by cache and result", ("cache", "result"),
+        [
+            (("ai_response", "hit"), ai_cache["hits"]),
+            (("ai_response", "store_hit"), ai_cache["store_hits"]),
+            (("ai_response", "miss"), ai_cache["misses"]),
+            (("quote", "hit"), quotes["hits"]),
+            (("quote", "stale_hit"), quotes["stale_hits"]),
+            (("quote", "miss"), quotes["misses"]),
+            (("profile", "hit"), profiles["hits"]),
+            (("profile", "miss"), profiles["misses"]),
+            (("token", "hit"), tokens["hits"]),
+            (("token", "miss"), tokens["misses"]),
+        ]
+    )
+
+REGISTRY.register_collector(collect_cache_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, LLM, MongoDB and market metrics."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # Include router
 app.include_router(api_router)
 
@@ -445,8 +743,53 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
+@app.on_event("startup")
+async def bootstrap_db_indexes():
+    await ensure_indexes(db)
+
+@app.on_event("startup")
+async def start_datetime_migration():
+    # Converts legacy ISO-string timestamps in the background; reads handle mixed data meanwhile
+    if os.environ.get('DATETIME_MIGRATION_ENABLED', 'true').lower() == 'true':
+        app.state.datetime_migration = asyncio.create_task(
+            run_datetime_migration(db, batch_size=int(os.environ.get('DATETIME_MIGRATION_BATCH', '500')))
+        )
+
+@app.on_event("startup")
+async def start_token_revocations():
+    await token_cache.load_revocations()
+    token_cache.start()
+
+@app.on_event("startup")
+async def start_write_behind():
+    write_behind.start()
+
+@app.on_event("startup")
+async def start_market_refresher():
+    if market_service.alpha_vantage_key:
+        market_refresher.start()
+    else:
+        logger.warning("ALPHA_VANTAGE_API_KEY missing; market snapshot refresher not started")
+
+@app.on_event("startup")
+async def start_llm_health_monitor():
+    ai_advisor.health.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    migration = getattr(app.state, 'datetime_migration', None)
+    if migration is not None:
+        migration.cancel()
+    await market_refresher.stop()
+    await ai_advisor.health.stop()
+    await token_cache.stop()
+    await market_service.close()
+    await conversation_memory.stop()
+    password_hasher.shutdown()
+    await write_behind.stop()
     client.close()
@@ -0,0 +1,89 @@
+import asyncio
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Collections holding one document per user, by loader kind
+USER_DOCUMENTS = {
+    "profile": "financial_profiles",
+    "progress": "user_progress",
+}
+
+class ProfileCache:
+    """Short-TTL in-process cache of per-user documents (profile, progress).
+
+    Writes in this process invalidate the affected entry; the TTL bounds how
+    stale another worker's copy can get.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind: str, user_id: str) -> Optional[Dict[str, Any]]:
+        key = (kind, user_id)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry[0])
+
+    def set(self, kind: str, user_id: str, doc: Dict[str, Any]):
+        key = (kind, user_id)
+        self._entries[key] = (copy.deepcopy(doc), time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str, kind: Optional[str] = None):
+        for name in ([kind] if kind else USER_DOCUMENTS):
+            self._entries.pop((name, user_id), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+class UserDataLoader:
+    """Request-scoped loader for the current user's profile and progress.
+
+    Each document is fetched at most once per request, even when several
+    dependencies ask for it concurrently; ``load`` fetches both in parallel.
+    """
+
+    def __init__(self, db, cache: ProfileCache, user_id: str):
+        self.db = db
+        self.cache = cache
+        self.user_id = user_id
+        self._loads: Dict[str, asyncio.Future] = {}
+
+    async def profile(self) -> Optional[Dict[str, Any]]:
+        return await self._get("profile")
+
+    async def progress(self) -> Optional[Dict[str, Any]]:
+        return await self._get("progress")
+
+    async def load(self) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        profile, progress = await asyncio.gather(self.profile(), self.progress())
+        return profile, progress
+
+    async def _get(self, kind: str) -> Optional[Dict[str, Any]]:
+        if kind not in self._loads:
+            self._loads[kind] = asyncio.ensure_future(self._fetch(kind))
+        doc = await self._loads[kind]
+        # Handlers may mutate what they get back; keep the request's copy pristine
+        return copy.deepcopy(doc)
+
+    async def _fetch(self, kind: str) -> Optional[Dict[str, Any]]:
+        doc = self.cache.get(kind, self.user_id)
+        if doc is not None:
+            return doc
+        doc = await self.db[USER_DOCUMENTS[kind]].find_one({"user_id": self.user_id}, {"_id": 0})
+        if doc is not None:
+            self.cache.set(kind, self.user_id, doc)
+        return doc
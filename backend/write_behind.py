@@ -0,0 +1,117 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from pymongo.errors import BulkWriteError, PyMongoError
+
+DUPLICATE_KEY = 11000
+
+class WriteBehindQueue:
+    """Persists generated artifacts off the request path.
+
+    Handlers ``submit`` a batch of documents and return without waiting for
+    MongoDB. A worker drains the bounded queue with unordered ``insert_many``
+    calls and retries failed batches with exponential backoff. When the queue
+    is full, the batch is written inline, so a slow database pushes back on
+    callers instead of growing memory. With ``enabled`` off every submit is
+    written inline.
+    """
+
+    def __init__(self, db, enabled: bool, max_size: int, max_retries: int, retry_delay: float):
+        self.db = db
+        self.enabled = enabled
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.logger = logging.getLogger("WriteBehindQueue")
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self._worker: Optional[asyncio.Task] = None
+        self._retries: set = set()
+        self.written = 0
+        self.retried = 0
+        self.dropped = 0
+        self.inline_writes = 0
+
+    def start(self):
+        if self.enabled and (self._worker is None or self._worker.done()):
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Flush what's queued (up to ``timeout`` seconds) and stop the worker."""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.logger.error(f"Write-behind flush timed out with {self._queue.qsize()} batches pending")
+        if self._retries:
+            self.logger.warning(f"Abandoning {len(self._retries)} pending write-behind retries on shutdown")
+        for task in [self._worker, *self._retries]:
+            task.cancel()
+        self._worker = None
+
+    async def insert_many(self, collection: str, docs: List[Dict[str, Any]]):
+        await self.db[collection].insert_many(docs, ordered=False)
+        self.written += len(docs)
+
+    async def submit(self, collection: str, docs: List[Dict[str, Any]]):
+        if not docs:
+            return
+        if self._worker is None:
+            await self.insert_many(collection, docs)
+            return
+        try:
+            self._queue.put_nowait((collection, docs, 0))
+        except asyncio.QueueFull:
+            self.inline_writes += 1
+            await self.insert_many(collection, docs)
+
+    async def _run(self):
+        while True:
+            collection, docs, attempt = await self._queue.get()
+            try:
+                await self.insert_many(collection, docs)
+            except BulkWriteError as e:
+                # Unordered inserts keep going past failures; duplicates mean an earlier attempt already landed
+                failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY}
+                self.written += e.details.get("nInserted", 0)
+                self._retry(collection, [doc for i, doc in enumerate(docs) if i in failed], attempt)
+            except PyMongoError as e:
+                self.logger.warning(f"Write-behind insert into {collection} failed: {e}")
+                self._retry(collection, docs, attempt)
+            except Exception as e:
+                # Not a database error, so retrying won't help; keep the worker alive
+                self.dropped += len(docs)
+                self.logger.error(f"Dropping {len(docs)} documents for {collection}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _retry(self, collection: str, docs: List[Dict[str, Any]], attempt: int):
+        if not docs:
+            return
+        if attempt >= self.max_retries:
+            self.dropped += len(docs)
+            self.logger.error(f"Dropping {len(docs)} documents for {collection} after {attempt + 1} attempts")
+            return
+        self.retried += 1
+        task = asyncio.create_task(self._requeue_later(collection, docs, attempt + 1))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _requeue_later(self, collection: str, docs: List[Dict[str, Any]], attempt: int):
+        await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+        try:
+            self._queue.put_nowait((collection, docs, attempt))
+        except asyncio.QueueFull:
+            self.dropped += len(docs)
+            self.logger.error(f"Write-behind queue full; dropping {len(docs)} documents for {collection}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize(),
+            "max_size": self._queue.maxsize,
+            "pending_retries": len(self._retries),
+            "written": self.written,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "inline_writes": self.inline_writes
+        }
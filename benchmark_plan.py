@@ -0,0 +1,85 @@
+"""Compare the fan-out plan (four LLM calls) with the single-prompt plan: latency, tokens and fallbacks"""
+import sys
+sys.path.insert(0, 'backend')
+
+import asyncio
+import time
+from collections import Counter
+from backend.ai_service import AIFinancialAdvisor, LLMGateway, ResponseCache
+
+PROFILE = {
+    "financial_level": "beginner",
+    "risk_tolerance": "moderate",
+    "monthly_income": 5000,
+    "monthly_expenses": 4200,
+    "skills": ["writing", "social media"],
+    "location": "New York",
+    "time_availability": "part-time"
+}
+
+ROUNDS = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+SECTIONS = ("budget", "investment", "income", "lessons")
+
+def fresh_advisor() -> AIFinancialAdvisor:
+    advisor = AIFinancialAdvisor()
+    # Every round must reach the model, so nothing may be served from cache
+    advisor.response_cache = ResponseCache(ttl_seconds=0, max_entries=0)
+    # ...and none may be shed by the rate limiter, or later fan-out rounds fall back instantly
+    gateway = advisor.gateway
+    advisor.gateway = LLMGateway(
+        max_concurrency=gateway.max_concurrency, rate_per_minute=1_000_000, burst=1_000_000,
+        failure_threshold=gateway.failure_threshold, reset_timeout=gateway.reset_timeout,
+        queue_timeout=gateway.queue_timeout
+    )
+    return advisor
+
+async def fanout(advisor: AIFinancialAdvisor):
+    """Returns the sections that fell back."""
+    results = await asyncio.gather(
+        advisor.analyze_budget(PROFILE["monthly_income"], PROFILE["monthly_expenses"], {}),
+        advisor.provide_investment_advice(
+            PROFILE["financial_level"], PROFILE["risk_tolerance"],
+            PROFILE["monthly_income"] - PROFILE["monthly_expenses"]
+        ),
+        advisor.generate_income_opportunities(
+            PROFILE["skills"], PROFILE["location"], PROFILE["time_availability"], PROFILE["financial_level"]
+        ),
+        advisor.generate_personalized_lessons(PROFILE["financial_level"], PROFILE)
+    )
+    # Lessons report their parse outcome instead of a fallback flag
+    lessons, lesson_outcome = results[-1]
+    results = [*results[:-1], (lessons, lesson_outcome == "fallback")]
+    return [name for name, (_, used_fallback) in zip(SECTIONS, results) if used_fallback]
+
+async def single(advisor: AIFinancialAdvisor):
+    """Returns the sections that fell back."""
+    plan = await advisor.generate_financial_plan(PROFILE)
+    return plan["fallback_sections"]
+
+async def run(name, generate):
+    advisor = fresh_advisor()
+    latencies = []
+    fallbacks = Counter()
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        fallbacks.update(await generate(advisor))
+        latencies.append(time.perf_counter() - started)
+    usage = advisor.usage.totals()
+    await advisor.close()
+
+    print(f"\n=== {name} ===")
+    print(f"Rounds: {ROUNDS}")
+    print(f"Latency: avg {sum(latencies) / len(latencies):.2f}s, max {max(latencies):.2f}s")
+    print(f"LLM calls: {usage['calls']}")
+    print(f"Prompt tokens per plan: {usage['prompt_tokens'] / ROUNDS:.0f}")
+    print(f"Completion tokens per plan: {usage['completion_tokens'] / ROUNDS:.0f}")
+    print("Fallbacks per section: " + ", ".join(f"{name} {fallbacks[name]}/{ROUNDS}" for name in SECTIONS))
+    if not usage["calls"]:
+        print("⚠️ No successful LLM calls - check GROQ_API_KEY")
+
+async def main():
+    await run("Fan-out (4 concurrent calls)", fanout)
+    await run("Single prompt", single)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -10,7 +10,7 @@ async def test_income_opportunities():
     advisor = AIFinancialAdvisor()
     
     # Test with user profile similar to "Junior"
-    result = await advisor.generate_income_opportunities(
+    result, used_fallback = await advisor.generate_income_opportunities(
         skills=["writing", "social media"],
         location="New York",
         time_availability="part-time",
@@ -27,7 +27,7 @@ async def test_income_opportunities():
         print(f"   Skills: {opp['skills_required']}")
     
     # Check if it's the fallback data
-    if result[0]['title'] == "Freelance Consulting":
+    if used_fallback:
         print("\n⚠️ FALLBACK DATA DETECTED - LLM not returning valid JSON")
     else:
         print("\n✅ Real AI-generated data")
@@ -36,7 +36,7 @@ async def test_budget_analysis():
     print("\n\nTesting Budget Analysis...")
     advisor = AIFinancialAdvisor()
     
-    result = await advisor.analyze_budget(
+    result, used_fallback = await advisor.analyze_budget(
         monthly_income=5000,
         monthly_expenses=4200,
         spending_patterns={}
@@ -54,7 +54,7 @@ async def test_budget_analysis():
     print(f"\nPotential Savings: ${result['potential_savings']}")
     
     # Check if it's fallback
-    if result['spending_leaks'][0]['category'] == "Subscriptions":
+    if used_fallback:
         print("\n⚠️ FALLBACK DATA DETECTED")
     else:
         print("\n✅ Real AI-generated data")
@@ -63,7 +63,7 @@ async def test_investment_advice():
     print("\n\nTesting Investment Advice...")
     advisor = AIFinancialAdvisor()
     
-    result = await advisor.provide_investment_advice(
+    result, used_fallback = await advisor.provide_investment_advice(
         financial_level="beginner",
         risk_tolerance="moderate",
         monthly_savings=800
@@ -80,7 +80,7 @@ async def test_investment_advice():
     print(f"\nPortfolio: {result['portfolio_suggestion']}")
     
     # Check if fallback
-    if result['recommendations'][0]['type'] == "Index Funds" and result['recommendations'][0]['allocation'] == 60:
+    if used_fallback:
         print("\n⚠️ FALLBACK DATA DETECTED")
     else:
         print("\n✅ Real AI-generated data")
@@ -22,7 +22,7 @@ async def test_with_real_profile():
     # Test Income Generation
     print("\n1. INCOME GENERATION TEST:")
     print("-" * 60)
-    income_opps = await advisor.generate_income_opportunities(
+    income_opps, income_fallback = await advisor.generate_income_opportunities(
         skills=["Coding", "Requirements Gathering & Elicitation", "CRM Systems"],
         location="Johannesburg, Gauteng, South Africa",
         time_availability="full time",
@@ -37,7 +37,7 @@ async def test_with_real_profile():
         print(f"   Skills: {opp['skills_required']}")
     
     # Check if fallback
-    if income_opps[0]['title'] == "Freelance Consulting":
+    if income_fallback:
         print("\n❌ FALLBACK DATA - AI not generating properly!")
     else:
         print("\n✅ Real AI data generated!")
@@ -45,7 +45,7 @@ async def test_with_real_profile():
     # Test Budget Analysis
     print("\n\n2. BUDGET ANALYSIS TEST:")
     print("-" * 60)
-    budget = await advisor.analyze_budget(
+    budget, budget_fallback = await advisor.analyze_budget(
         monthly_income=10000,
         monthly_expenses=7500,
         spending_patterns={}
@@ -57,7 +57,7 @@ async def test_with_real_profile():
     
     print(f"\nPotential Savings: ${budget['potential_savings']}")
     
-    if budget['spending_leaks'][0]['category'] == "Subscriptions":
+    if budget_fallback:
         print("\n❌ FALLBACK DATA")
     else:
         print("\n✅ Real AI data")
@@ -65,7 +65,7 @@ async def test_with_real_profile():
     # Test Investment Advice
     print("\n\n3. INVESTMENT ADVICE TEST:")
     print("-" * 60)
-    investment = await advisor.provide_investment_advice(
+    investment, investment_fallback = await advisor.provide_investment_advice(
         financial_level="beginner",
         risk_tolerance="low",
         monthly_savings=2500
@@ -76,7 +76,7 @@ async def test_with_real_profile():
     for rec in investment['recommendations']:
         print(f"  - {rec['type']}: {rec['allocation']}%")
     
-    if investment['recommendations'][0]['allocation'] == 60:
+    if investment_fallback:
         print("\n❌ FALLBACK DATA")
     else:
         print("\n✅ Real AI data")
@@ -84,7 +84,7 @@ async def test_with_real_profile():
     # Test Education
     print("\n\n4. EDUCATION LESSONS TEST:")
     print("-" * 60)
-    lessons = await advisor.generate_personalized_lessons(
+    lessons, lessons_outcome = await advisor.generate_personalized_lessons(
         financial_level="beginner",
         user_profile={
             "skills": ["Coding", "Requirements Gathering & Elicitation", "CRM Systems"],
@@ -99,7 +99,7 @@ async def test_with_real_profile():
         print(f"   Duration: {lesson['duration_minutes']} min")
         print(f"   Content: {lesson['content']}")
     
-    if lessons[0]['title'] == "Understanding Compound Interest":
+    if lessons_outcome == "fallback":
         print("\n❌ FALLBACK DATA")
     else:
         print("\n✅ Real AI data")
@@ -0,0 +1,19 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+# Backend modules import each other by bare name, as they do when uvicorn runs from backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def advisor(monkeypatch):
+    # Imported here so tests of modules without the LLM client's dependencies still collect
+    from ai_service import AIFinancialAdvisor
+
+    monkeypatch.setenv("GROQ_API_KEY", "")
+    advisor = AIFinancialAdvisor()
+    yield advisor
+    asyncio.run(advisor.http_client.aclose())
@@ -0,0 +1,42 @@
+import asyncio
+
+import httpx
+
+from market_service import MarketDataService
+
+QUOTE = {"Global Quote": {"05. price": "510.5", "10. change percent": "0.4%", "06. volume": "1000"}}
+
+
+def fetch_quotes(monkeypatch, replies, symbols):
+    monkeypatch.setenv("ALPHA_VANTAGE_API_KEY", "SECRETKEY123")
+
+    def handler(request):
+        status, body = replies[request.url.params["symbol"]]
+        return httpx.Response(status, json=body)
+
+    async def run():
+        service = MarketDataService()
+        await service.http_client.aclose()
+        service.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await service.get_quotes(symbols)
+        finally:
+            await service.close()
+
+    return asyncio.run(run())
+
+
+def test_batch_reports_status_per_symbol(monkeypatch):
+    quotes = fetch_quotes(monkeypatch, {
+        "SPY": (200, QUOTE),
+        "ZZZZ": (200, {"Global Quote": {}}),
+        "QQQ": (200, {"Note": "Thank you for using Alpha Vantage! Our standard API rate limit is 25 requests per day."}),
+    }, ["spy", "ZZZZ", "QQQ"])
+    assert [(quote["symbol"], quote["status"]) for quote in quotes] == [("SPY", "ok"), ("ZZZZ", "not_found"), ("QQQ", "error")]
+    assert quotes[2]["error"] == "rate_limited"
+
+
+def test_http_errors_do_not_leak_the_api_key(monkeypatch):
+    quotes = fetch_quotes(monkeypatch, {"SPY": (429, {}), "QQQ": (503, {})}, ["SPY", "QQQ"])
+    assert [quote["error"] for quote in quotes] == ["http_429", "http_503"]
+    assert "SECRETKEY123" not in repr(quotes)
@@ -0,0 +1,79 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from chat_memory import ConversationMemory
+
+COVERED = datetime(2026, 1, 5, 12, 0, tzinfo=timezone.utc)
+MESSAGES = [
+    {"user_id": "u1", "role": "user", "content": "How big should my emergency fund be?", "timestamp": COVERED - timedelta(minutes=1)},
+    {"user_id": "u1", "role": "assistant", "content": "Aim for three to six months.", "timestamp": COVERED},
+    {"user_id": "u1", "role": "user", "content": "And where do I keep it?", "timestamp": COVERED + timedelta(minutes=1)},
+    {"user_id": "u1", "role": "assistant", "content": "A high-yield savings account.", "timestamp": COVERED + timedelta(minutes=1, milliseconds=1)},
+]
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length):
+        return self.docs[:length]
+
+
+class FakeMessages:
+    def find(self, query, projection):
+        after = query.get("timestamp", {}).get("$gt")
+        return FakeCursor([doc for doc in MESSAGES if after is None or doc["timestamp"] > after])
+
+
+class FakeSummaries:
+    def __init__(self, doc):
+        self.doc = doc
+
+    async def find_one(self, query, projection):
+        return self.doc
+
+
+class FakeDB:
+    def __init__(self, summary_doc):
+        self.chat_summaries = FakeSummaries(summary_doc)
+        self.chat_messages = FakeMessages()
+
+
+def test_context_holds_messages_newer_than_the_summary():
+    memory = ConversationMemory(FakeDB({"summary": "Emergency fund: 3-6 months.", "covers_until": COVERED}), None, 1200)
+    summary, recent = asyncio.run(memory.get_context("u1", recent_limit=4))
+    assert summary == "Emergency fund: 3-6 months."
+    assert [msg["content"] for msg in recent] == ["A high-yield savings account.", "And where do I keep it?"]
+
+
+def test_context_without_summary_is_the_latest_messages():
+    memory = ConversationMemory(FakeDB(None), None, 1200)
+    summary, recent = asyncio.run(memory.get_context("u1", recent_limit=3))
+    assert summary is None
+    assert len(recent) == 3 and recent[0]["content"] == "A high-yield savings account."
+
+
+def test_chat_prompt_sends_summary_and_uncovered_messages(advisor):
+    recent = list(reversed(MESSAGES[2:]))
+    prompt = advisor._build_chat_prompt("Which bank?", {}, recent, "Emergency fund: 3-6 months.")
+    assert "Emergency fund: 3-6 months." in prompt
+    assert "user: And where do I keep it?\nassistant: A high-yield savings account." in prompt
+    assert prompt.index("Emergency fund") < prompt.index("And where do I keep it?") < prompt.index("Which bank?")
+
+
+def test_offline_summary_keeps_the_advisor_reply(advisor):
+    async def no_reply(prompt, method, payload_model=None):
+        return ""
+
+    advisor._call_llm = no_reply
+    summary = asyncio.run(advisor.summarize_conversation(None, "Where do I keep it?", "A high-yield savings account."))
+    assert summary == "- User asked: Where do I keep it?\n- Advisor replied: A high-yield savings account."
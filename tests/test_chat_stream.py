@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from ai_service import ChatStreamInterrupted
+
+
+def chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content), finish_reason=None)])
+
+
+class FakeStream:
+    def __init__(self, items):
+        self.items = items
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        self.closed = True
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for item in self.items:
+            if isinstance(item, Exception):
+                raise item
+            yield chunk(item)
+
+
+def use_stream(advisor, stream):
+    async def create(**kwargs):
+        return stream
+
+    advisor.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def test_abandoned_stream_is_closed(advisor):
+    stream = FakeStream(["Save ", "ten ", "percent."])
+    use_stream(advisor, stream)
+
+    async def main():
+        replies = advisor.stream_chat_with_advisor("How much should I save?", {}, [])
+        first = await replies.__anext__()
+        await replies.aclose()
+        return first
+
+    assert asyncio.run(main()) == "Save "
+    assert stream.closed
+
+
+def test_upstream_error_after_partial_reply_interrupts_the_stream(advisor):
+    stream = FakeStream(["Save ", ConnectionResetError("peer went away")])
+    use_stream(advisor, stream)
+
+    received = []
+
+    async def main():
+        async for delta in advisor.stream_chat_with_advisor("How much should I save?", {}, []):
+            received.append(delta)
+
+    with pytest.raises(ChatStreamInterrupted):
+        asyncio.run(main())
+    assert received == ["Save "]
+    assert stream.closed
@@ -0,0 +1,102 @@
+import asyncio
+import json
+
+import pytest
+
+LEAKS = {"spending_leaks": [{"category": "Dining", "amount": 120, "description": "Takeout"}],
+         "recommendations": ["Cook at home"], "potential_savings": 120}
+
+
+def run_budget(advisor, replies):
+    calls = []
+
+    async def fake_call(prompt, method, payload_model=None):
+        calls.append(method)
+        return replies.pop(0)
+
+    advisor._call_llm = fake_call
+
+    async def main():
+        return [await advisor.analyze_budget(5000, 4000, {}) for _ in range(2)]
+
+    return asyncio.run(main()), calls
+
+
+def test_validated_reply_is_cached(advisor):
+    (first, second), calls = run_budget(advisor, [json.dumps(LEAKS)])
+    assert first == second == (LEAKS, False)
+    assert calls == ["budget"]
+
+
+def test_fallback_is_not_cached(advisor):
+    empty = json.dumps({"spending_leaks": [], "recommendations": []})
+    (first, second), calls = run_budget(advisor, [empty, json.dumps(LEAKS)])
+    assert first[1] is True
+    assert second == (LEAKS, False)
+    assert len(calls) == 2
+
+
+def test_salvaged_partial_reply_is_not_cached(advisor):
+    truncated = json.dumps(LEAKS)[:-30]
+    (first, second), calls = run_budget(advisor, [truncated, json.dumps(LEAKS)])
+    assert first[1] is False
+    assert len(calls) == 2
+
+PLAN = {
+    "budget": LEAKS,
+    "investment": {"recommendations": [{"type": "Index fund", "allocation": "60%", "description": "Broad market"}],
+                   "portfolio_strategy": "Buy and hold", "risk_assessment": "Moderate"},
+    "income": {"opportunities": [{"title": "Tutoring", "description": "Teach math", "potential_income": "$400/month",
+                                  "difficulty": "Easy", "time_commitment": "5h/week"}]},
+    "lessons": {"lessons": [{"title": f"Lesson {i}", "category": "Basics", "content": "Save first.",
+                             "duration_minutes": 20, "points": 100} for i in range(1, 5)]},
+}
+
+
+def run_plan(advisor, replies):
+    calls = []
+
+    async def fake_call(prompt, method, payload_model=None):
+        calls.append(method)
+        return replies.pop(0)
+
+    advisor._call_llm = fake_call
+
+    async def main():
+        return [await advisor.generate_financial_plan({"monthly_income": 5000}) for _ in range(2)]
+
+    return asyncio.run(main()), calls
+
+
+def test_complete_plan_is_cached(advisor):
+    (first, second), calls = run_plan(advisor, [json.dumps(PLAN)])
+    assert first == second and first["fallback_sections"] == []
+    assert calls == ["plan"]
+
+
+def test_truncated_plan_is_not_cached(advisor):
+    full = json.dumps(PLAN)
+    truncated = full[:full.index('"Lesson 3"') + 4]
+    (first, second), calls = run_plan(advisor, [truncated, full])
+    assert len(first["lessons"]) == 2 and first["fallback_sections"] == []
+    assert len(second["lessons"]) == 4
+    assert calls == ["plan", "plan"]
+
+
+def test_truncated_lesson_set_reports_its_outcome(advisor):
+    async def fake_call(prompt, method, payload_model=None):
+        full = json.dumps(PLAN["lessons"])
+        return full[:full.index('"Lesson 2"') + 4]
+
+    advisor._call_llm = fake_call
+    lessons, outcome = asyncio.run(advisor.generate_personalized_lessons("beginner", {}))
+    assert len(lessons) == 1
+    assert outcome == "recovered"
+
+
+def test_fallback_serves_canned_section_without_counting(advisor):
+    budget = advisor.fallback("budget")
+    assert budget["spending_leaks"]
+    assert advisor.json_stats.snapshot() == {}
+    with pytest.raises(ValueError):
+        advisor.fallback("lessons")
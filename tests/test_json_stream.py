@@ -0,0 +1,59 @@
+from json_stream import JSONStreamParser, ParseStats, extract_json
+
+
+def test_complete_object_is_parsed():
+    assert extract_json('{"budget": {"potential_savings": 350}}') == ({"budget": {"potential_savings": 350}}, True)
+
+
+def test_truncated_array_keeps_complete_items():
+    text = '{"lessons": [{"title": "Budgeting"}, {"title": "Index funds", "cont'
+    assert extract_json(text) == ({"lessons": [{"title": "Budgeting"}]}, False)
+
+
+def test_truncated_top_level_array():
+    value, complete = extract_json('[{"title": "a"}, {"title": "b"}, {"title"')
+    assert value == [{"title": "a"}, {"title": "b"}]
+    assert not complete
+
+
+def test_bracketed_prose_before_payload_is_skipped():
+    text = 'Sure [see notes] - here it is: {"opportunities": [{"title": "Tutoring"}]} Hope it helps!'
+    assert extract_json(text) == ({"opportunities": [{"title": "Tutoring"}]}, True)
+
+
+def test_bare_array_of_objects_is_kept():
+    assert extract_json('[{"title": "a"}]') == ([{"title": "a"}], True)
+
+
+def test_no_json():
+    assert extract_json("The model had nothing to say.") == (None, False)
+    assert extract_json("") == (None, False)
+
+
+def test_chunked_feed_matches_one_shot_parse():
+    text = 'Here you go: {"opportunities": [{"title": "x, y"}, {"title": "braces } inside"}]}'
+    parser = JSONStreamParser()
+    finished = [parser.feed(text[i:i + 5]) for i in range(0, len(text), 5)]
+
+    assert finished[-1] and not any(finished[:-1])
+    assert parser.result() == extract_json(text)
+
+
+def test_chunked_feed_recovers_when_stream_stops_early():
+    parser = JSONStreamParser()
+    for chunk in ['{"lessons": [{"title": "One"}', ', {"title": "Two"}', ', {"title": "Thr']:
+        assert not parser.feed(chunk)
+    assert parser.result() == ({"lessons": [{"title": "One"}, {"title": "Two"}]}, False)
+
+
+def test_parse_stats_rates():
+    stats = ParseStats()
+    stats.record("income", "validated")
+    stats.record("income", "recovered")
+    stats.record_fallback("income")
+
+    income = stats.snapshot()["income"]
+    assert income["validated"] == 1
+    assert income["recovered"] == 1
+    assert income["recovered_rate"] == 0.5
+    assert income["fallback_rate"] == 0.5
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from ai_service import GatewayRejectedError, LLMGateway
+
+
+def make_gateway(**overrides):
+    settings = dict(max_concurrency=2, rate_per_minute=600, burst=10,
+                    failure_threshold=3, reset_timeout=30, queue_timeout=0.05)
+    settings.update(overrides)
+    return LLMGateway(**settings)
+
+
+async def call(gateway, succeed=True):
+    async with gateway.slot():
+        if succeed:
+            gateway.record_success()
+        else:
+            gateway.record_failure()
+
+
+def test_breaker_opens_after_consecutive_failures():
+    gateway = make_gateway()
+    for _ in range(3):
+        asyncio.run(call(gateway, succeed=False))
+
+    assert gateway.circuit == "open"
+    with pytest.raises(GatewayRejectedError, match="circuit open"):
+        asyncio.run(call(gateway))
+    assert gateway.rejected["circuit_open"] == 1
+
+
+def test_success_resets_failure_count():
+    gateway = make_gateway()
+    for succeed in [False, False, True, False, False]:
+        asyncio.run(call(gateway, succeed))
+    assert gateway.circuit == "closed"
+
+
+def test_breaker_half_opens_then_closes_on_success():
+    gateway = make_gateway()
+    for _ in range(3):
+        gateway.record_failure()
+    gateway._opened_at -= gateway.reset_timeout
+
+    async def trial():
+        async with gateway.slot():
+            assert gateway.circuit == "half_open"
+            # Only the single trial call is let through while half open
+            with pytest.raises(GatewayRejectedError, match="circuit open"):
+                async with gateway.slot():
+                    pass
+            gateway.record_success()
+
+    asyncio.run(trial())
+    assert gateway.circuit == "closed"
+    asyncio.run(call(gateway))
+
+
+def test_failed_trial_reopens_breaker():
+    gateway = make_gateway()
+    for _ in range(3):
+        gateway.record_failure()
+    gateway._opened_at -= gateway.reset_timeout
+
+    asyncio.run(call(gateway, succeed=False))
+    assert gateway.circuit == "open"
+    with pytest.raises(GatewayRejectedError, match="circuit open"):
+        asyncio.run(call(gateway))
+
+
+def test_token_bucket_limits_bursts_and_refills():
+    gateway = make_gateway(rate_per_minute=60, burst=2)
+    asyncio.run(call(gateway))
+    asyncio.run(call(gateway))
+    with pytest.raises(GatewayRejectedError, match="rate limited"):
+        asyncio.run(call(gateway))
+    assert gateway.rejected["rate_limited"] == 1
+
+    # One second at 60/minute refills exactly one token
+    gateway._refilled_at -= 1.0
+    asyncio.run(call(gateway))
+    with pytest.raises(GatewayRejectedError, match="rate limited"):
+        asyncio.run(call(gateway))
+
+
+def test_busy_when_all_slots_are_taken():
+    gateway = make_gateway(max_concurrency=1)
+
+    async def overlap():
+        async with gateway.slot():
+            with pytest.raises(GatewayRejectedError, match="busy"):
+                async with gateway.slot():
+                    pass
+
+    asyncio.run(overlap())
+    assert gateway.rejected["busy"] == 1
+    assert gateway.state()["in_flight"] == 0
+
+
+def test_deep_probe_reports_open_breaker_as_rejection(advisor):
+    advisor.gateway = make_gateway(failure_threshold=1)
+    asyncio.run(call(advisor.gateway, succeed=False))
+
+    probe = asyncio.run(advisor.health.probe())
+
+    assert probe["rejected"] is True
+    assert probe["error"] == "gateway rejected: circuit open"
+    assert advisor.health.status()["status"] == "gateway_rejected"
@@ -0,0 +1,65 @@
+from llm_usage import DEFAULT_LIMITS, GenerationLimits, UsageTracker, parse_limit_overrides
+
+
+def tracker(adaptive=True, **overrides):
+    return UsageTracker(limits=dict(DEFAULT_LIMITS), adaptive=adaptive, min_samples=20, **overrides)
+
+
+def feed(usage, method, completion_tokens, count=20, truncated=False):
+    for _ in range(count):
+        usage.record(method, 100, completion_tokens, truncated)
+
+
+def test_declared_limits_until_enough_samples():
+    usage = tracker()
+    feed(usage, "chat", 100, count=19)
+    assert usage.adaptive_cap("chat") is None
+    assert usage.limits_for("chat") == DEFAULT_LIMITS["chat"]
+
+
+def test_cap_follows_p95_with_headroom():
+    usage = tracker()
+    feed(usage, "chat", 100, count=19)
+    feed(usage, "chat", 200, count=1)
+    # p95 of 20 samples is the 19th smallest
+    assert usage.adaptive_cap("chat") == 125
+    assert usage.limits_for("chat") == GenerationLimits(max_tokens=125, temperature=DEFAULT_LIMITS["chat"].temperature)
+
+
+def test_cap_bounded_by_floor_and_twice_declared():
+    usage = tracker()
+    feed(usage, "chat", 10)
+    feed(usage, "plan", 5000, truncated=True)
+    assert usage.adaptive_cap("chat") == 64
+    assert usage.adaptive_cap("plan") == 2 * DEFAULT_LIMITS["plan"].max_tokens
+
+
+def test_floor_never_exceeds_declared_limit():
+    usage = tracker()
+    feed(usage, "probe", 1)
+    assert usage.adaptive_cap("probe") == DEFAULT_LIMITS["probe"].max_tokens
+
+
+def test_adaptive_off_keeps_declared_limits():
+    usage = tracker(adaptive=False)
+    feed(usage, "chat", 10)
+    assert usage.limits_for("chat") == DEFAULT_LIMITS["chat"]
+
+
+def test_totals_and_snapshot():
+    usage = tracker()
+    usage.record("chat", 100, 50, False)
+    usage.record("plan", 300, 1800, True)
+
+    assert usage.totals() == {"calls": 2, "prompt_tokens": 400, "completion_tokens": 1850, "truncated": 1}
+    snapshot = usage.snapshot()
+    assert snapshot["chat"]["avg_completion_tokens"] == 50.0
+    assert snapshot["summary"]["calls"] == 0
+
+
+def test_parse_limit_overrides():
+    overrides = parse_limit_overrides("chat=400:0.6, plan=2000,,bad=")
+    assert overrides == {
+        "chat": GenerationLimits(max_tokens=400, temperature=0.6),
+        "plan": GenerationLimits(max_tokens=2000, temperature=DEFAULT_LIMITS["plan"].temperature),
+    }
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from market_service import MarketSnapshotRefresher
+
+
+class FakeService:
+    def __init__(self, prices):
+        self.prices = prices
+
+    async def refresh_quote(self, symbol):
+        return {"symbol": symbol, "price": self.prices.get(symbol, 0), "change_percent": 0}
+
+    def get_crypto_prices(self):
+        return []
+
+
+def make_refresher(service, monkeypatch, max_age="900"):
+    monkeypatch.setenv("MARKET_CALLS_PER_MINUTE", "0")
+    monkeypatch.setenv("MARKET_SNAPSHOT_MAX_AGE", max_age)
+    return MarketSnapshotRefresher(service, symbols=["SPY", "QQQ"])
+
+
+def test_failed_fetch_does_not_restamp_the_snapshot(monkeypatch):
+    service = FakeService({"SPY": 510.0, "QQQ": 440.0})
+    refresher = make_refresher(service, monkeypatch)
+    asyncio.run(refresher.refresh_once())
+    first = refresher.snapshot
+
+    # Alpha Vantage throttling: HTTP 200 with a "Note", parsed as price 0
+    service.prices = {}
+    asyncio.run(refresher.refresh_once())
+
+    assert refresher.snapshot is first
+    assert [quote["price"] for quote in first.stocks] == [510.0, 440.0]
+
+
+def test_last_updated_is_the_oldest_quote_served(monkeypatch):
+    service = FakeService({"SPY": 510.0, "QQQ": 440.0})
+    refresher = make_refresher(service, monkeypatch)
+    asyncio.run(refresher.refresh_once())
+    old = datetime.now(timezone.utc) - timedelta(seconds=120)
+    refresher._quotes["QQQ"] = (refresher._quotes["QQQ"][0], old)
+
+    service.prices = {"SPY": 511.0}
+    asyncio.run(refresher.refresh_once())
+
+    assert refresher.snapshot.stocks[0]["price"] == 511.0
+    assert refresher.snapshot.last_updated == old
+
+
+def test_quotes_past_max_age_are_dropped(monkeypatch):
+    service = FakeService({"SPY": 510.0, "QQQ": 440.0})
+    refresher = make_refresher(service, monkeypatch, max_age="60")
+    asyncio.run(refresher.refresh_once())
+    stale = datetime.now(timezone.utc) - timedelta(seconds=61)
+    refresher._quotes["QQQ"] = (refresher._quotes["QQQ"][0], stale)
+
+    service.prices = {"SPY": 511.0}
+    asyncio.run(refresher.refresh_once())
+
+    assert [quote["symbol"] for quote in refresher.snapshot.stocks] == ["SPY"]
+
+
+class CachedService(FakeService):
+    def __init__(self, prices, cached):
+        super().__init__(prices)
+        self.cached = cached
+
+    def cached_quotes(self, symbols):
+        return [self.cached[symbol] for symbol in symbols if symbol in self.cached]
+
+
+def test_overview_before_first_snapshot_serves_the_cache_without_fetching(monkeypatch):
+    service = CachedService({}, {"QQQ": {"symbol": "QQQ", "price": 440.0, "change_percent": 0}})
+    service.refresh_quote = None  # any upstream fetch would fail the test
+    refresher = make_refresher(service, monkeypatch)
+
+    overview = refresher.overview()
+
+    assert overview["warming_up"] is True
+    assert [quote["symbol"] for quote in overview["stocks"]] == ["QQQ"]
+
+
+def test_overview_after_first_pass_is_the_snapshot(monkeypatch):
+    refresher = make_refresher(CachedService({"SPY": 510.0, "QQQ": 440.0}, {}), monkeypatch)
+    asyncio.run(refresher.refresh_once())
+
+    overview = refresher.overview()
+
+    assert overview["warming_up"] is False
+    assert [quote["price"] for quote in overview["stocks"]] == [510.0, 440.0]
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from metrics import HTTP_REQUEST_SECONDS, MONGO_COMMAND_SECONDS, MetricsMiddleware, MongoCommandMetrics, Registry
+
+
+def test_histogram_buckets_are_cumulative_and_count_matches_inf():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, "/api/x")
+
+    lines = registry.render().splitlines()
+
+    assert lines == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/api/x",le="0.1"} 1',
+        'latency_seconds_bucket{route="/api/x",le="1"} 3',
+        'latency_seconds_bucket{route="/api/x",le="+Inf"} 4',
+        'latency_seconds_sum{route="/api/x"} 4.05',
+        'latency_seconds_count{route="/api/x"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter("errors_total", "Errors", ("kind",)).inc('bad "quote"\\\nline')
+    assert 'errors_total{kind="bad \\"quote\\"\\\\\\nline"} 1' in registry.render().splitlines()
+
+
+def test_collector_samples_are_rendered_at_scrape_time():
+    registry = Registry()
+    hits = {"value": 3}
+    registry.register_collector(lambda: [("cache_hits_total", "counter", "Cache hits", ("cache",), [(("quotes",), hits["value"])])])
+    hits["value"] = 5
+
+    assert registry.render() == (
+        "# HELP cache_hits_total Cache hits\n"
+        "# TYPE cache_hits_total counter\n"
+        'cache_hits_total{cache="quotes"} 5\n'
+    )
+
+
+def _observations(histogram, *labels):
+    counts, _ = histogram._series.get(labels, ([0], 0.0))
+    return sum(counts)
+
+
+def test_get_more_is_labelled_with_its_collection():
+    listener = MongoCommandMetrics()
+    before = _observations(MONGO_COMMAND_SECONDS, "chat_messages", "getMore", "ok")
+    ids = dict(connection_id=("localhost", 27017), request_id=41)
+    listener.started(SimpleNamespace(command_name="getMore", command={"getMore": 9, "collection": "chat_messages"}, **ids))
+    listener.succeeded(SimpleNamespace(command_name="getMore", duration_micros=1500, **ids))
+
+    assert _observations(MONGO_COMMAND_SECONDS, "chat_messages", "getMore", "ok") == before + 1
+
+
+def test_middleware_labels_matched_routes_by_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/api/market/stock/{symbol}")
+    async def stock(symbol: str):
+        return {"symbol": symbol}
+
+    matched = _observations(HTTP_REQUEST_SECONDS, "GET", "/api/market/stock/{symbol}", "200")
+    unmatched = _observations(HTTP_REQUEST_SECONDS, "GET", "unmatched", "404")
+    client = TestClient(app)
+    client.get("/api/market/stock/AAPL")
+    client.get("/api/nowhere")
+
+    assert _observations(HTTP_REQUEST_SECONDS, "GET", "/api/market/stock/{symbol}", "200") == matched + 1
+    assert _observations(HTTP_REQUEST_SECONDS, "GET", "unmatched", "404") == unmatched + 1
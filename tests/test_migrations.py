@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from migrations import migrate_datetimes
+
+T0 = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, n):
+        return self.docs[:n]
+
+
+class FakeCollection:
+    """Just enough of a motor collection for migrate_datetimes."""
+
+    def __init__(self, docs, after_find=None):
+        self.docs = docs
+        self.after_find = after_find
+        self.finds = 0
+
+    def find(self, query, projection):
+        self.finds += 1
+        field = next(key for key in query if key != "_id")
+        after = query.get("_id", {}).get("$gt")
+        matched = [dict(doc) for doc in self.docs
+                   if isinstance(doc.get(field), str) and (after is None or doc["_id"] > after)]
+        if self.after_find:
+            self.after_find(self)
+        return FakeCursor(matched)
+
+    async def bulk_write(self, updates, ordered):
+        modified = 0
+        for update in updates:
+            for doc in self.docs:
+                if all(doc.get(key) == value for key, value in update._filter.items()):
+                    doc.update(update._doc["$set"])
+                    modified += 1
+        return SimpleNamespace(modified_count=modified)
+
+
+class FakeDB:
+    def __init__(self, **collections):
+        self.collections = collections
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection([]))
+
+
+def migrate(db, batch_size=2):
+    return asyncio.run(migrate_datetimes(db, batch_size=batch_size, pause=0))
+
+
+def test_strings_are_converted_in_batches():
+    users = FakeCollection([{"_id": i, "created_at": T0.isoformat()} for i in range(5)])
+    converted = migrate(FakeDB(users=users))
+    assert converted["users.created_at"] == 5
+    assert all(doc["created_at"] == T0 for doc in users.docs)
+    # three batches of at most two, then one empty read
+    assert users.finds == 4
+
+
+def test_unparseable_values_are_skipped_once():
+    users = FakeCollection([{"_id": 1, "created_at": "last tuesday"}, {"_id": 2, "created_at": T0.isoformat()}])
+    converted = migrate(FakeDB(users=users), batch_size=1)
+    assert converted["users.created_at"] == 1
+    assert users.docs[0]["created_at"] == "last tuesday"
+    assert users.finds == 3
+
+
+def test_document_changed_mid_run_is_left_alone():
+    def rewrite(collection):
+        collection.docs[0]["created_at"] = "2025-01-01T00:00:00+00:00"
+
+    users = FakeCollection([{"_id": 1, "created_at": T0.isoformat()}], after_find=rewrite)
+    converted = migrate(FakeDB(users=users))
+    assert converted["users.created_at"] == 0
+    assert users.docs[0]["created_at"] == "2025-01-01T00:00:00+00:00"
+
+
+def test_rerun_converts_nothing():
+    messages = FakeCollection([{"_id": i, "timestamp": T0.isoformat()} for i in range(3)])
+    db = FakeDB(chat_messages=messages)
+    assert migrate(db)["chat_messages.timestamp"] == 3
+    assert set(migrate(db).values()) == {0}
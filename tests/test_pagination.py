@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor, fetch_page
+
+T0 = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _type_rank(value):
+    # MongoDB sorts every string below every date
+    return 1 if isinstance(value, datetime) else 0
+
+
+def _matches(doc, query):
+    for field, condition in query.items():
+        if field == "$or":
+            if not any(_matches(doc, branch) for branch in condition):
+                return False
+            continue
+        value = doc.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for op, operand in condition.items():
+            if op == "$type":
+                if operand != "string" or not isinstance(value, str):
+                    return False
+            elif op == "$lt":
+                # Range operators only compare values of the same BSON type
+                if _type_rank(value) != _type_rank(operand) or not value < operand:
+                    return False
+            else:
+                raise AssertionError(f"unsupported operator {op}")
+    return True
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.docs.sort(key=lambda doc: (_type_rank(doc[field]), doc[field]), reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, n):
+        return self.docs[:n]
+
+
+class FakeCollection:
+    """Just enough of a motor collection for fetch_page."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query, projection):
+        return FakeCursor([dict(doc) for doc in self.docs if _matches(doc, query)])
+
+
+def _all_pages(collection, limit):
+    ids, cursor = [], None
+    while True:
+        docs, cursor = asyncio.run(fetch_page(collection, {"user_id": "u1"}, "created_at", limit, cursor))
+        ids.extend(doc["id"] for doc in docs)
+        if cursor is None:
+            return ids
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(T0, "abc")
+    assert decode_cursor(cursor) == (T0, "abc")
+    assert "=" not in cursor
+
+
+def test_cursor_round_trip_for_string_timestamp():
+    assert decode_cursor(encode_cursor("2024-05-01T12:00:00+00:00", "abc")) == ("2024-05-01T12:00:00+00:00", "abc")
+
+
+@pytest.mark.parametrize("cursor", ["!!", "not-a-cursor", encode_cursor(T0, "x")[:-4]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_pages_walk_newest_first_without_gaps():
+    docs = [{"user_id": "u1", "id": f"{i:02d}", "created_at": T0 + timedelta(minutes=i)} for i in range(7)]
+    docs.append({"user_id": "u2", "id": "other", "created_at": T0})
+
+    assert _all_pages(FakeCollection(docs), limit=3) == ["06", "05", "04", "03", "02", "01", "00"]
+
+
+def test_timestamp_ties_split_across_pages_by_id():
+    docs = [{"user_id": "u1", "id": doc_id, "created_at": T0} for doc_id in ["a", "b", "c", "d", "e"]]
+
+    assert _all_pages(FakeCollection(docs), limit=2) == ["e", "d", "c", "b", "a"]
+
+
+def test_last_page_has_no_cursor():
+    docs = [{"user_id": "u1", "id": "a", "created_at": T0}]
+    page, cursor = asyncio.run(fetch_page(FakeCollection(docs), {"user_id": "u1"}, "created_at", 1))
+    assert [doc["id"] for doc in page] == ["a"]
+    assert cursor is None
+
+
+def test_legacy_string_timestamps_follow_dates():
+    docs = [
+        {"user_id": "u1", "id": "new", "created_at": T0 + timedelta(days=1)},
+        {"user_id": "u1", "id": "mid", "created_at": T0},
+        {"user_id": "u1", "id": "old", "created_at": (T0 - timedelta(days=1)).isoformat()},
+        {"user_id": "u1", "id": "oldest", "created_at": (T0 - timedelta(days=2)).isoformat()},
+    ]
+
+    assert _all_pages(FakeCollection(docs), limit=1) == ["new", "mid", "old", "oldest"]
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from auth_utils import PasswordHasher
+
+
+def test_full_queue_is_refused_with_503():
+    hasher = PasswordHasher(max_workers=1, max_queue=2)
+    release = threading.Event()
+
+    async def main():
+        blocked = [asyncio.create_task(hasher._run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(HTTPException) as raised:
+                await hasher._run(lambda: "hash")
+        finally:
+            release.set()
+            await asyncio.gather(*blocked)
+        return raised.value
+
+    error = asyncio.run(main())
+    hasher.shutdown()
+
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "1"}
+    stats = hasher.stats()
+    assert (stats["rejected"], stats["completed"], stats["pending"]) == (1, 2, 0)
+
+
+def test_failed_jobs_are_counted_apart_from_completed():
+    hasher = PasswordHasher(max_workers=1, max_queue=4)
+
+    def broken():
+        raise ValueError("not a bcrypt hash")
+
+    async def main():
+        with pytest.raises(ValueError):
+            await hasher._run(broken)
+        await hasher._run(lambda: True)
+
+    asyncio.run(main())
+    hasher.shutdown()
+
+    stats = hasher.stats()
+    assert (stats["completed"], stats["failed"], stats["pending"]) == (1, 1, 0)
@@ -0,0 +1,60 @@
+from prompt_builder import PromptBuilder, compact_table, estimate_tokens
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+def test_shorten_cuts_at_line_boundary_from_the_end():
+    text = "line one\nline two\nline three\n"
+    assert PromptBuilder._shorten(text, 14, keep_tail=False) == "line one\n"
+
+
+def test_shorten_keep_tail_drops_oldest_lines():
+    text = "line one\nline two\nline three\n"
+    assert PromptBuilder._shorten(text, 14, keep_tail=True) == "line three\n"
+
+
+def test_shorten_without_newlines_cuts_mid_text():
+    assert PromptBuilder._shorten("abcdefghij", 4, keep_tail=False) == "abcd"
+    assert PromptBuilder._shorten("abcdefghij", 4, keep_tail=True) == "ghij"
+
+
+def test_shorten_to_nothing():
+    assert PromptBuilder._shorten("abc\n", 0, keep_tail=False) == ""
+
+
+def test_under_budget_prompt_is_untouched():
+    prompt = PromptBuilder("test", budget_tokens=100).add("Question?\n").add_optional("history\n").build()
+    assert prompt == "Question?\nhistory\n"
+
+
+def test_optional_sections_trimmed_lowest_priority_first():
+    history = "".join(f"old message {i}\n" for i in range(20))
+    skills = "Skills: writing, coding\n"
+    prompt = (
+        PromptBuilder("test", budget_tokens=30)
+        .add("You are an advisor.\n")
+        .add_optional(skills, priority=1)
+        .add_optional(history, priority=0, keep_tail=True)
+        .add("Answer briefly.")
+        .build()
+    )
+    assert prompt.startswith("You are an advisor.\nSkills: writing, coding\n")
+    assert prompt.endswith("old message 19\nAnswer briefly.")
+    assert "old message 0\n" not in prompt
+    assert estimate_tokens(prompt) <= 30
+
+
+def test_required_sections_are_never_trimmed():
+    required = "x" * 400
+    prompt = PromptBuilder("test", budget_tokens=10).add(required).add_optional("extra").build()
+    assert prompt == required
+
+
+def test_compact_table():
+    rows = [{"symbol": "SPY", "price": 510.256, "change_percent": 0.5}, {"symbol": "A|B", "price": 3.0}]
+    assert compact_table(rows, ["symbol", "price", "change_percent"]) == \
+        "symbol|price|change_percent\nSPY|510.26|0.5\nA/B|3|"
@@ -0,0 +1,80 @@
+from market_service import QuoteCache, _parse_ttl_overrides
+
+QUOTE = {"symbol": "SPY", "price": 510.2, "change_percent": 0.4}
+
+
+def make_cache(**overrides):
+    settings = dict(default_ttl=60, stale_ttl=300, max_entries=3)
+    settings.update(overrides)
+    return QuoteCache(**settings)
+
+
+def test_fresh_hit_is_case_insensitive_copy():
+    cache = make_cache()
+    cache.set("spy", QUOTE)
+
+    quote, state = cache.get("SPY")
+    assert (quote, state) == (QUOTE, "fresh")
+    quote["price"] = 0
+    assert cache.get("spy")[0]["price"] == 510.2
+
+
+def test_miss_for_unknown_symbol():
+    cache = make_cache()
+    assert cache.get("QQQ") == (None, "miss")
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_entry_is_stale_then_missing():
+    cache = make_cache()
+    cache.set("SPY", QUOTE, ttl=0)
+    assert cache.get("SPY") == (QUOTE, "stale")
+
+    expired = make_cache(stale_ttl=0)
+    expired.set("SPY", QUOTE, ttl=0)
+    assert expired.get("SPY") == (None, "miss")
+    assert expired.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = make_cache(max_entries=2)
+    cache.set("SPY", QUOTE)
+    cache.set("QQQ", QUOTE)
+    cache.get("SPY")
+    cache.set("AAPL", QUOTE)
+
+    assert cache.get("QQQ") == (None, "miss")
+    assert cache.get("SPY")[1] == "fresh"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_overrides():
+    cache = make_cache(ttl_overrides=_parse_ttl_overrides("tsla:15, SPY:30,bad"))
+    assert cache.ttl_for("TSLA") == 15
+    assert cache.ttl_for("spy") == 30
+    assert cache.ttl_for("AAPL") == 60
+
+
+def test_stats_hit_rate():
+    cache = make_cache()
+    cache.set("SPY", QUOTE)
+    cache.set("QQQ", QUOTE, ttl=0)
+    cache.get("SPY")
+    cache.get("QQQ")
+    cache.get("AAPL")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["stale_hits"], stats["misses"]) == (1, 1, 1)
+    assert stats["hit_rate"] == 0.667
+
+
+def test_peek_serves_stale_entries_without_counting_a_lookup():
+    cache = make_cache()
+    cache.set("spy", QUOTE, ttl=0)
+    assert cache.peek("SPY") == QUOTE
+    assert cache.peek("QQQ") is None
+
+    expired = make_cache(stale_ttl=0)
+    expired.set("SPY", QUOTE, ttl=0)
+    assert expired.peek("SPY") is None
+    assert cache.stats()["stale_hits"] == cache.stats()["misses"] == 0
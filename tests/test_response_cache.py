@@ -0,0 +1,98 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from ai_service import ResponseCache
+
+
+class FakeStore:
+    def __init__(self):
+        self.docs = {}
+        self.reads = 0
+
+    async def find_one(self, query, projection):
+        self.reads += 1
+        doc = self.docs.get(query["key"])
+        if doc and doc["expires_at"] > query["expires_at"]["$gt"]:
+            return {"value": doc["value"], "expires_at": doc["expires_at"]}
+        return None
+
+    async def update_one(self, query, update, upsert=False):
+        self.docs[query["key"]] = dict(update["$set"])
+
+
+def test_key_ignores_input_order():
+    assert ResponseCache.make_key("budget", {"income": 5000, "expenses": 4000}) == \
+        ResponseCache.make_key("budget", {"expenses": 4000, "income": 5000})
+    assert ResponseCache.make_key("budget", {"income": 5000}) != ResponseCache.make_key("investment", {"income": 5000})
+
+
+def test_memory_hit_returns_a_copy():
+    cache = ResponseCache(ttl_seconds=60, max_entries=10)
+
+    async def main():
+        await cache.set("k", {"items": [1]})
+        first = await cache.get("k")
+        first["items"].append(2)
+        return await cache.get("k")
+
+    assert asyncio.run(main()) == {"items": [1]}
+    assert cache.hits == 2
+
+
+def test_expired_and_evicted_entries_miss():
+    expired = ResponseCache(ttl_seconds=0, max_entries=10)
+    small = ResponseCache(ttl_seconds=60, max_entries=1)
+
+    async def main():
+        await expired.set("k", 1)
+        await small.set("a", 1)
+        await small.set("b", 2)
+        return await expired.get("k"), await small.get("a"), await small.get("b")
+
+    assert asyncio.run(main()) == (None, None, 2)
+
+
+def test_store_tier_serves_other_workers_and_warms_memory():
+    store = FakeStore()
+    writer = ResponseCache(ttl_seconds=60, max_entries=10)
+    reader = ResponseCache(ttl_seconds=60, max_entries=10)
+    writer.attach_store(store)
+    reader.attach_store(store)
+
+    async def main():
+        await writer.set("k", {"plan": "a"})
+        first = await reader.get("k")
+        second = await reader.get("k")
+        return first, second
+
+    assert asyncio.run(main()) == ({"plan": "a"}, {"plan": "a"})
+    assert (reader.store_hits, reader.hits, store.reads) == (1, 1, 1)
+
+
+def test_expired_store_entry_misses():
+    store = FakeStore()
+    store.docs["k"] = {"key": "k", "value": 1, "expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}
+    cache = ResponseCache(ttl_seconds=60, max_entries=10)
+    cache.attach_store(store)
+
+    assert asyncio.run(cache.get("k")) is None
+    assert cache.misses == 1
+
+
+def test_store_failure_degrades_to_memory():
+    class BrokenStore:
+        async def find_one(self, *args):
+            raise ConnectionError("mongo down")
+
+        async def update_one(self, *args, **kwargs):
+            raise ConnectionError("mongo down")
+
+    cache = ResponseCache(ttl_seconds=60, max_entries=10)
+    cache.attach_store(BrokenStore())
+
+    async def main():
+        missing = await cache.get("k")
+        await cache.set("k", 1)
+        return missing, await cache.get("k")
+
+    assert asyncio.run(main()) == (None, 1)
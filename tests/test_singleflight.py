@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"price": 1}
+
+    async def main():
+        return await asyncio.gather(*(flights.do("SPY", fetch) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert results == [{"price": 1}] * 5
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "started": 1, "shared": 4}
+
+
+def test_distinct_keys_run_separately():
+    flights = SingleFlight()
+
+    async def main():
+        return await asyncio.gather(flights.do("a", lambda: asyncio.sleep(0, "a")),
+                                    flights.do("b", lambda: asyncio.sleep(0, "b")))
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert flights.started == 2
+
+
+def test_key_is_released_after_completion():
+    flights = SingleFlight()
+
+    async def main():
+        first = await flights.do("k", lambda: asyncio.sleep(0, 1))
+        second = await flights.do("k", lambda: asyncio.sleep(0, 2))
+        return first, second
+
+    assert asyncio.run(main()) == (1, 2)
+    assert flights.shared == 0
+
+
+def test_error_reaches_every_waiter():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        return await asyncio.gather(flights.do("k", fail), flights.do("k", fail), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_does_not_cancel_shared_work():
+    flights = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        first = asyncio.create_task(flights.do("k", slow))
+        second = asyncio.create_task(flights.do("k", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "done"
@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from models import LessonsPayload
+
+PARTIAL = '{"lessons": [{"title": "Budgeting basics", "category": "Budgeting"}, {"title": "Index fu'
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.text = json.dumps(body)
+        self._body = body
+
+    def json(self):
+        return self._body
+
+
+def ok(content):
+    return FakeResponse(200, {
+        "choices": [{"message": {"content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 50, "completion_tokens": 20},
+    })
+
+
+def bad_request(code, message, **extra):
+    return FakeResponse(400, {"error": {"message": message, "type": "invalid_request_error", "code": code, **extra}})
+
+
+def serve(advisor, *responses):
+    sent = []
+    queue = list(responses)
+
+    async def post(url, headers=None, json=None):
+        sent.append(json.get("response_format", {}).get("type"))
+        return queue.pop(0)
+
+    advisor.http_client.post = post
+    return sent
+
+
+def test_failed_generation_is_salvaged_without_a_second_call(advisor):
+    sent = serve(advisor, bad_request("json_validate_failed", "Failed to generate JSON", failed_generation=PARTIAL))
+
+    text = asyncio.run(advisor._call_llm("prompt", "lessons", payload_model=LessonsPayload))
+
+    assert text == PARTIAL
+    assert sent == ["json_object"]
+    assert advisor._load_json(text, None) == ({"lessons": [{"title": "Budgeting basics", "category": "Budgeting"}]}, "recovered")
+    assert advisor.usage.totals()["truncated"] == 1
+    assert advisor.response_format == "json_object"
+
+
+def test_unrecoverable_failed_generation_retries_without_format(advisor):
+    sent = serve(advisor, bad_request("json_validate_failed", "Failed to generate JSON", failed_generation="Sorry, I"),
+                 ok('{"lessons": []}'))
+
+    assert asyncio.run(advisor._call_llm("prompt", "lessons", payload_model=LessonsPayload)) == '{"lessons": []}'
+    assert sent == ["json_object", None]
+
+
+def test_unsupported_format_is_downgraded_for_later_calls(advisor):
+    advisor.response_format = "json_schema"
+    sent = serve(advisor, bad_request(None, "response_format `json_schema` is not supported with this model"),
+                 ok("{}"), ok("{}"))
+
+    asyncio.run(advisor._call_llm("first", "lessons", payload_model=LessonsPayload))
+    asyncio.run(advisor._call_llm("second", "lessons", payload_model=LessonsPayload))
+
+    assert sent == ["json_schema", None, "json_object"]
+    assert advisor.response_format == "json_object"
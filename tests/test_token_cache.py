@@ -0,0 +1,113 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from auth_utils import TokenClaims, VerifiedTokenCache
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs
+
+
+class FakeRevocations:
+    def __init__(self, fail_writes=False):
+        self.docs = {}
+        self.fail_writes = fail_writes
+
+    async def update_one(self, query, update, upsert=False):
+        if self.fail_writes:
+            raise ConnectionError("mongo down")
+        self.docs[query["digest"]] = dict(update["$set"])
+
+    def find(self, query, projection):
+        cutoff = query["exp"]["$gt"]
+        return FakeCursor([dict(doc) for doc in self.docs.values() if doc["exp"] > cutoff])
+
+
+def claims(expires_in=60.0):
+    return TokenClaims(user_id="u1", exp=time.time() + expires_in)
+
+
+def test_hit_and_miss():
+    cache = VerifiedTokenCache(max_entries=10)
+    cache.put("token", claims())
+
+    assert cache.get("token").user_id == "u1"
+    assert cache.get("other") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_expired_entry_is_dropped():
+    cache = VerifiedTokenCache(max_entries=10)
+    cache.put("token", claims(expires_in=-1))
+
+    assert cache.get("token") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = VerifiedTokenCache(max_entries=2)
+    cache.put("a", claims())
+    cache.put("b", claims())
+    cache.get("a")
+    cache.put("c", claims())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+
+def test_tokens_are_stored_by_digest():
+    cache = VerifiedTokenCache(max_entries=10)
+    cache.put("secret-token", claims())
+    assert "secret-token" not in cache._entries
+
+
+def test_revoke_drops_cached_claims_until_expiry():
+    cache = VerifiedTokenCache(max_entries=10)
+    cache.put("token", claims())
+    asyncio.run(cache.revoke("token", time.time() + 60))
+    asyncio.run(cache.revoke("old", time.time() - 1))
+
+    assert cache.is_revoked("token")
+    assert cache.get("token") is None
+    assert not cache.is_revoked("old")
+    assert not cache.is_revoked("never-revoked")
+
+
+def test_revocation_reaches_other_workers_through_the_store():
+    store = FakeRevocations()
+    worker_a = VerifiedTokenCache(max_entries=10)
+    worker_b = VerifiedTokenCache(max_entries=10)
+    worker_a.attach_store(store)
+    worker_b.attach_store(store)
+
+    asyncio.run(worker_a.revoke("token", time.time() + 60))
+    assert not worker_b.is_revoked("token")
+
+    assert asyncio.run(worker_b.load_revocations()) == 1
+    assert worker_b.is_revoked("token")
+
+
+def test_expired_store_entries_are_not_loaded():
+    store = FakeRevocations()
+    store.docs["digest"] = {"digest": "digest", "exp": datetime.now(timezone.utc) - timedelta(seconds=1)}
+    cache = VerifiedTokenCache(max_entries=10)
+    cache.attach_store(store)
+
+    assert asyncio.run(cache.load_revocations()) == 0
+
+
+def test_failed_store_write_fails_the_logout():
+    cache = VerifiedTokenCache(max_entries=10)
+    cache.attach_store(FakeRevocations(fail_writes=True))
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(cache.revoke("token", time.time() + 60))
+    assert raised.value.status_code == 503
@@ -0,0 +1,55 @@
+import asyncio
+
+from user_data import ProfileCache, UserDataLoader
+
+
+class FakeCollection:
+    def __init__(self, doc):
+        self.doc = doc
+        self.reads = 0
+
+    async def find_one(self, query, projection):
+        self.reads += 1
+        # Yield so concurrent callers overlap with this read
+        await asyncio.sleep(0)
+        return dict(self.doc) if self.doc is not None else None
+
+
+class FakeDB:
+    def __init__(self, profile, progress=None):
+        self.financial_profiles = FakeCollection(profile)
+        self.user_progress = FakeCollection(progress)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+
+def make_cache():
+    return ProfileCache(ttl_seconds=60, max_entries=16)
+
+
+def test_concurrent_profile_calls_share_one_read():
+    db = FakeDB({"user_id": "u1", "monthly_income": 5000})
+    loader = UserDataLoader(db, make_cache(), "u1")
+
+    async def main():
+        return await asyncio.gather(loader.profile(), loader.profile(), loader.load())
+
+    first, second, (third, progress) = asyncio.run(main())
+
+    assert first == second == third == {"user_id": "u1", "monthly_income": 5000}
+    assert progress is None
+    assert db.financial_profiles.reads == 1
+    assert db.user_progress.reads == 1
+
+
+def test_invalidate_makes_the_next_request_read_fresh():
+    db = FakeDB({"user_id": "u1", "monthly_income": 5000})
+    cache = make_cache()
+    asyncio.run(UserDataLoader(db, cache, "u1").profile())
+
+    db.financial_profiles.doc = {"user_id": "u1", "monthly_income": 6500}
+    assert asyncio.run(UserDataLoader(db, cache, "u1").profile())["monthly_income"] == 5000
+    cache.invalidate("u1", "profile")
+    assert asyncio.run(UserDataLoader(db, cache, "u1").profile())["monthly_income"] == 6500
+    assert db.financial_profiles.reads == 2
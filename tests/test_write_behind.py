@@ -0,0 +1,128 @@
+import asyncio
+
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from write_behind import DUPLICATE_KEY, WriteBehindQueue
+
+
+class FlakyCollection:
+    """Fails insert_many with the queued errors, then records what it is given."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.inserted = []
+        self.attempts = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.attempts.append([doc["id"] for doc in docs])
+        if self.errors:
+            raise self.errors.pop(0)
+        self.inserted.extend(doc["id"] for doc in docs)
+
+
+def make_queue(collection, **overrides):
+    settings = dict(enabled=True, max_size=10, max_retries=2, retry_delay=0.001)
+    settings.update(overrides)
+    return WriteBehindQueue({"scans": collection}, **settings)
+
+
+async def drain(queue):
+    await asyncio.sleep(0.05)
+    await queue.stop(timeout=1)
+
+
+def docs(*ids):
+    return [{"id": doc_id} for doc_id in ids]
+
+
+def test_submit_is_written_by_the_worker():
+    collection = FlakyCollection()
+    queue = make_queue(collection)
+
+    async def main():
+        queue.start()
+        await queue.submit("scans", docs("a", "b"))
+        await drain(queue)
+
+    asyncio.run(main())
+    assert collection.inserted == ["a", "b"]
+    assert queue.stats()["written"] == 2
+
+
+def test_failed_batch_is_retried():
+    collection = FlakyCollection([AutoReconnect("primary stepped down")])
+    queue = make_queue(collection)
+
+    async def main():
+        queue.start()
+        await queue.submit("scans", docs("a"))
+        await drain(queue)
+
+    asyncio.run(main())
+    assert collection.attempts == [["a"], ["a"]]
+    assert collection.inserted == ["a"]
+    assert (queue.retried, queue.dropped) == (1, 0)
+
+
+def test_duplicates_are_not_retried():
+    error = BulkWriteError({
+        "nInserted": 1,
+        "writeErrors": [
+            {"index": 1, "code": DUPLICATE_KEY, "errmsg": "duplicate"},
+            {"index": 2, "code": 91, "errmsg": "shutdown in progress"},
+        ],
+    })
+    collection = FlakyCollection([error])
+    queue = make_queue(collection)
+
+    async def main():
+        queue.start()
+        await queue.submit("scans", docs("a", "b", "c"))
+        await drain(queue)
+
+    asyncio.run(main())
+    # "a" landed, "b" was already there from an earlier attempt; only "c" goes again
+    assert collection.attempts == [["a", "b", "c"], ["c"]]
+    assert queue.written == 2
+
+
+def test_batch_is_dropped_after_max_retries():
+    collection = FlakyCollection([AutoReconnect("down")] * 3)
+    queue = make_queue(collection, max_retries=2)
+
+    async def main():
+        queue.start()
+        await queue.submit("scans", docs("a"))
+        await drain(queue)
+
+    asyncio.run(main())
+    assert len(collection.attempts) == 3
+    assert (queue.retried, queue.dropped, queue.written) == (2, 1, 0)
+
+
+def test_full_queue_writes_inline():
+    collection = FlakyCollection()
+    queue = make_queue(collection, max_size=1)
+
+    async def main():
+        # A worker that never drains: the first batch fills the queue
+        queue._worker = asyncio.create_task(asyncio.sleep(3600))
+        await queue.submit("scans", docs("a"))
+        await queue.submit("scans", docs("b"))
+        queue._worker.cancel()
+
+    asyncio.run(main())
+    assert collection.inserted == ["b"]
+    assert queue.inline_writes == 1
+
+
+def test_disabled_queue_writes_inline():
+    collection = FlakyCollection()
+    queue = make_queue(collection, enabled=False)
+
+    async def main():
+        queue.start()
+        await queue.submit("scans", docs("a"))
+
+    asyncio.run(main())
+    assert collection.inserted == ["a"]